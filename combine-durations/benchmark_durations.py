@@ -0,0 +1,276 @@
+"""Benchmark combine-durations against synthetic artifact sets.
+
+Generates N OSes x M runs x K tests worth of duration artifacts, times the separate
+phases of combine-durations and records the peak (Python heap) memory of each,
+results are written as JSON so they can be compared across commits.
+"""
+
+from __future__ import annotations
+
+import json
+import platform
+import random
+import subprocess
+import sys
+import tracemalloc
+from argparse import ArgumentParser, ArgumentTypeError
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from rich import box
+from rich.console import Console
+from rich.table import Table
+
+from combine_durations import (
+    aggregate_new_durations,
+    aggregate_old_durations,
+    build_stats_table,
+    dump_durations,
+    estimate_durations,
+)
+
+if TYPE_CHECKING:
+    from argparse import Namespace
+    from collections.abc import Iterator
+    from typing import Any
+
+CONSOLE = Console(color_system=None, soft_wrap=True)
+print = CONSOLE.print
+
+#: phases of combine-durations, in the order they run
+PHASES = ("import", "aggregate_new", "aggregate_old", "stats", "write")
+
+
+def validate_count(value: str) -> int:
+    try:
+        count = int(value)
+    except ValueError:
+        count = 0
+    if count < 1:
+        raise ArgumentTypeError(f"{value} is not a valid count")
+    return count
+
+
+def parse_args(argv: list[str] | None = None) -> Namespace:
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--oses", type=validate_count, default=3)
+    parser.add_argument("--runs", type=validate_count, default=10)
+    parser.add_argument("--tests", type=validate_count, default=10_000)
+    parser.add_argument(
+        "--aggregation",
+        choices=("samples", "streaming"),
+        default="samples",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="Skip tracing memory allocations (tracing slows down every phase).",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Write the results as JSON to this file.",
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="Previous results (JSON) to compare against.",
+    )
+    parser.add_argument(
+        "--label",
+        help="Free-form label stored with the results (e.g. the commit).",
+    )
+    return parser.parse_args(argv)
+
+
+def generate_test_ids(count: int, rng: random.Random) -> list[str]:
+    # mimic pytest node IDs: tests/<package>/test_<module>.py::Test<Class>::test_<name>
+    return [
+        f"tests/package_{i % 50}/test_module_{i % 400}.py"
+        f"::TestClass{i % 7}"
+        f"::test_{rng.choice(('parse', 'install', 'solve', 'render'))}_case_{i}"
+        f"{'[param-' + str(i % 13) + ']' if i % 3 == 0 else ''}"
+        for i in range(count)
+    ]
+
+
+def generate_artifacts(
+    root: Path,
+    oses: int,
+    runs: int,
+    tests: int,
+    seed: int = 0,
+) -> tuple[Path, Path]:
+    """Write `runs` artifacts per OS and the previously combined durations.
+
+    Each run drops a few tests and the previous durations are missing a few tests so
+    the benchmark also covers the added/removed paths.
+    """
+    rng = random.Random(seed)
+    test_ids = generate_test_ids(tests, rng)
+    baseline = [rng.expovariate(2) for _ in test_ids]
+
+    artifacts_dir = root / "artifacts"
+    durations_dir = root / "durations"
+    durations_dir.mkdir(parents=True)
+    for os_index in range(oses):
+        os_name = f"OS{os_index}"
+        for run in range(runs):
+            run_dir = artifacts_dir / str(1_000_000 + run) / f"{os_name}-all"
+            run_dir.mkdir(parents=True, exist_ok=True)
+            (run_dir / f"{os_name}.json").write_text(
+                json.dumps(
+                    {
+                        test_id: duration * rng.uniform(0.8, 1.2)
+                        for test_id, duration in zip(test_ids, baseline)
+                        if rng.random() > 0.01
+                    },
+                    # like pytest-split's --store-durations
+                    indent=4,
+                    sort_keys=True,
+                )
+            )
+        (durations_dir / f"{os_name}.json").write_text(
+            dump_durations(
+                {
+                    test_id: duration
+                    for test_id, duration in zip(test_ids, baseline)
+                    if rng.random() > 0.01
+                }
+            )
+        )
+    return artifacts_dir, durations_dir
+
+
+@contextmanager
+def measure(results: dict[str, dict[str, float]], phase: str, memory: bool) -> Iterator:
+    if memory:
+        tracemalloc.start()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        seconds = perf_counter() - start
+        results[phase] = {"seconds": seconds}
+        if memory:
+            results[phase]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def measure_import(module: str = "combine_durations") -> dict[str, float]:
+    # cold import time of the module in a fresh interpreter, the last line reported by
+    # -X importtime is the requested module: "import time: self | cumulative | name"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = int(result.stderr.splitlines()[-1].split("|")[1])
+    return {"seconds": cumulative / 1e6}
+
+
+def run_benchmark(
+    artifacts_dir: Path,
+    durations_dir: Path,
+    aggregation: str = "samples",
+    memory: bool = True,
+) -> dict[str, dict[str, float]]:
+    """Run the phases of combine-durations and return their timings."""
+    streaming = aggregation == "streaming"
+    results: dict[str, dict[str, float]] = {"import": measure_import()}
+
+    with measure(results, "aggregate_new", memory):
+        combined, new_stats = aggregate_new_durations(artifacts_dir, streaming)
+
+    with measure(results, "aggregate_old", memory):
+        combined, old_stats = aggregate_old_durations(durations_dir, combined)
+
+    with measure(results, "stats", memory):
+        Console(file=StringIO(), width=120).print(
+            build_stats_table(new_stats, old_stats)
+        )
+
+    with measure(results, "write", memory):
+        for os_name, os_combined in combined.items():
+            (durations_dir / f"{os_name}.json").write_text(
+                dump_durations(estimate_durations(os_combined, "mean"))
+            )
+
+    return results
+
+
+def print_results(
+    phases: dict[str, dict[str, float]],
+    previous: dict[str, dict[str, float]] | None = None,
+) -> None:
+    table = Table(box=box.MARKDOWN)
+    table.add_column("Phase")
+    table.add_column("Time (sec)")
+    table.add_column("Peak memory (MiB)")
+    for phase in PHASES:
+        result = phases[phase]
+        before = (previous or {}).get(phase, {})
+
+        seconds = f"{result['seconds']:.3f}"
+        if before.get("seconds"):
+            seconds += f" ({result['seconds'] / before['seconds']:.2f}x)"
+
+        peak = "-"
+        if "peak_bytes" in result:
+            peak = f"{result['peak_bytes'] / 2**20:.1f}"
+            if before.get("peak_bytes"):
+                peak += f" ({result['peak_bytes'] / before['peak_bytes']:.2f}x)"
+
+        table.add_row(phase, seconds, peak)
+    print(table)
+
+
+def main(argv: list[str] | None = None) -> dict[str, Any]:
+    args = parse_args(argv)
+
+    with TemporaryDirectory() as tmp:
+        artifacts_dir, durations_dir = generate_artifacts(
+            Path(tmp), args.oses, args.runs, args.tests, args.seed
+        )
+        phases = run_benchmark(
+            artifacts_dir, durations_dir, args.aggregation, args.memory
+        )
+
+    results = {
+        "label": args.label,
+        "parameters": {
+            "oses": args.oses,
+            "runs": args.runs,
+            "tests": args.tests,
+            "aggregation": args.aggregation,
+            "seed": args.seed,
+            "memory": args.memory,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "phases": phases,
+    }
+
+    previous = None
+    if args.compare:
+        previous = json.loads(args.compare.read_text())["phases"]
+    print_results(phases, previous)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=4) + "\n")
+    return results
+
+
+if __name__ == "__main__":
+    main()
+    sys.exit(0)
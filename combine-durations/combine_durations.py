@@ -2,29 +2,171 @@
 
 from __future__ import annotations
 
+import codecs
 import json
+import mmap
 import os
+import re
+import struct
 import sys
 from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
 from dataclasses import dataclass, field
 from functools import partial
+from heapq import heappush, heappushpop, heapreplace, merge, nsmallest
+from itertools import groupby
+from json.decoder import WHITESPACE, JSONDecodeError, scanstring
+from json.encoder import encode_basestring_ascii
+from json.scanner import NUMBER_RE
+from math import inf, isfinite, nan
+from operator import itemgetter
 from pathlib import Path
 from statistics import fmean
+from time import perf_counter
 from typing import TYPE_CHECKING
 
 from rich import box
 from rich.console import Console
+from rich.segment import Segment
 from rich.table import Table
+from rich.text import Text
+
+try:
+    from orjson import JSONDecodeError as FastDecodeError
+    from orjson import loads as fast_loads
+except ImportError:
+    # ImportError: orjson is not installed
+    try:
+        from msgspec import DecodeError as FastDecodeError
+        from msgspec.json import decode as fast_loads
+    except ImportError:
+        # ImportError: msgspec is not installed
+        FastDecodeError = fast_loads = None
+
+try:
+    import resource
+except ImportError:
+    # ImportError: resource is not available on Windows
+    resource = None
 
 if TYPE_CHECKING:
-    from collections.abc import Iterable
+    from collections.abc import (
+        Callable,
+        Collection,
+        Container,
+        Iterable,
+        Iterator,
+        Sequence,
+    )
+    from typing import Any
+
+    import numpy as np
+    from numpy.typing import NDArray
 
     COMBINED_TYPE = dict[str, dict[str, list[float]]]
+    STREAMING_TYPE = dict[str, dict[str, "RunningDuration"]]
+    COLUMNAR_TYPE = dict[str, "ColumnarDurations"]
+
+#: number of most recent run IDs remembered by the sample store
+RUNS_LIMIT = 100
+
+#: number of removed tests listed per OS, the rest are only counted
+REMOVED_LIMIT = 50
+
+#: GitHub rejects step summaries larger than 1 MiB, leave room for the heading
+SUMMARY_LIMIT = 2**20 - 2**10
+TRUNCATED_NOTICE = (
+    "\n> [!WARNING]\n"
+    "> Summary truncated to 1 MiB, see the job log for the full output.\n"
+)
+DETAILS_OPEN_RE = re.compile(r"<details[\s>]")
+
+
+class BoundedRecord(list):
+    """Console record buffer that stops recording past `limit` bytes.
+
+    Keeps the summary below GitHub's step summary limit without holding the entire
+    console output in memory, anything past the limit is replaced by a notice.
+
+    The console records each flushed render (e.g., a whole table or `<details>`
+    block) with a single `extend`, which is kept or dropped as a whole so the
+    summary is only ever cut between renders. `<details>` blocks left open by
+    earlier renders are closed before the notice.
+
+    Each action is self-contained, keep in sync with
+    `template-files/template_files.py`.
+    """
+
+    def __init__(self, limit: int = SUMMARY_LIMIT) -> None:
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+        self.details = 0
+        self.truncated = False
+
+    def extend(self, segments: Iterable[Segment]) -> None:
+        if self.truncated:
+            return
+        segments = [segment for segment in segments if not segment.control]
+        text = "".join(segment.text for segment in segments)
+        size = len(text.encode())
+        if self.size + size > self.limit:
+            self.truncated = True
+            # the notice starts with a blank line, which also ends a markdown table
+            self.append(Segment("\n</details>\n" * self.details + TRUNCATED_NOTICE))
+            return
+        self.size += size
+        self.details += count_details(text)
+        super().extend(segments)
 
-CONSOLE = Console(color_system="standard", soft_wrap=True, record=True)
+    def __delitem__(self, key: int | slice) -> None:
+        # the console clears the record with `del record[:]` when exporting
+        super().__delitem__(key)
+        text = "".join(segment.text for segment in self)
+        self.size = len(text.encode())
+        self.details = count_details(text)
+        self.truncated = False
+
+    def clear(self) -> None:
+        del self[:]
+
+
+def count_details(text: str) -> int:
+    # number of `<details>` blocks opened but not closed
+    return len(DETAILS_OPEN_RE.findall(text)) - text.count("</details>")
+
+
+class SummaryConsole(Console):
+    """Recording console whose record is bounded by `summary_limit` bytes."""
+
+    def __init__(self, *args, summary_limit: int = SUMMARY_LIMIT, **kwargs) -> None:
+        super().__init__(*args, record=True, **kwargs)
+        # rich has no public hook for the record, this replaces the private
+        # `Console._record_buffer` list which is extended once per flushed render and
+        # cleared with `del [:]`/`clear()` (checked against rich 12.6, 13.9 & 15.0)
+        self._record_buffer = BoundedRecord(summary_limit)
+
+
+# the summary is markdown, tables must never wrap (stdout isn't a TTY in CI, where rich
+# would default to 80 columns and wrap the headers & cells across rows)
+CONSOLE = SummaryConsole(color_system="standard", soft_wrap=True, width=100_000_000)
 print = CONSOLE.print
 
 
+def json_loads(content: bytes) -> Any:
+    if fast_loads is None:
+        return json.loads(content)
+    try:
+        return fast_loads(content)
+    except FastDecodeError:
+        # FastDecodeError: NaN/Infinity are not valid JSON (rejected by orjson &
+        # msgspec) but are written by json.dumps, i.e., by `dump_durations`
+        return json.loads(content)
+
+
 def validate_dir(value: str | os.PathLike[str] | Path, writable: bool = False) -> Path:
     try:
         path = Path(value).expanduser().resolve()
@@ -40,29 +182,642 @@ def validate_dir(value: str | os.PathLike[str] | Path, writable: bool = False) -
         raise ArgumentTypeError(f"{value} is not a valid directory: {err}")
 
 
-def parse_args() -> Namespace:
+def validate_file(value: str | os.PathLike[str] | Path) -> Path:
+    try:
+        path = Path(value).expanduser().resolve()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.is_dir():
+            raise IsADirectoryError(f"{path} is a directory")
+        return path
+    except (FileExistsError, IsADirectoryError, PermissionError) as err:
+        # FileExistsError: parent is a file, not a directory
+        # IsADirectoryError: value is a directory, not a file
+        # PermissionError: parent is not writable
+        raise ArgumentTypeError(f"{value} is not a valid file: {err}")
+
+
+def validate_jobs(value: str) -> int:
+    try:
+        jobs = int(value)
+        if jobs < 0:
+            raise ValueError("must be 0 (all cores) or a positive number")
+        return jobs or os.cpu_count() or 1
+    except ValueError as err:
+        # ValueError: value is not a number or negative
+        raise ArgumentTypeError(f"{value} is not a valid number of jobs: {err}")
+
+
+def parse_bool(value: str) -> bool:
+    if (value := value.strip().lower()) in ("1", "true", "yes", "on"):
+        return True
+    elif value in ("", "0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{value!r} is not a boolean (true/false)")
+
+
+def parse_args(argv: Sequence[str] | None = None) -> Namespace:
     # parse CLI for inputs
     parser = ArgumentParser()
-    parser.add_argument("--durations-dir", type=validate_dir, required=True)
+    parser.add_argument("--durations-dir", type=validate_dir)
+    parser.add_argument("--artifacts-dir", type=partial(validate_dir, writable=True))
+    parser.add_argument(
+        "--batch",
+        type=validate_file,
+        help=(
+            "JSON manifest of repositories to combine concurrently (--jobs at a "
+            'time), a list of {"repository", "artifacts-dir", "durations-dir"} '
+            'objects with optional "samples-file", "runs-manifest", and '
+            '"report-file", replaces --durations-dir & --artifacts-dir.'
+        ),
+    )
+    parser.add_argument(
+        "--aggregation",
+        choices=["samples", "streaming", "columnar", "merge"],
+        default="samples",
+        help=(
+            "How to aggregate durations. `samples` keeps every duration sample, "
+            "`streaming` keeps a constant-size running count/sum per test, "
+            "`columnar` keeps every sample in contiguous arrays (vectorized "
+            "statistics, means may differ from `samples` in the last digit), "
+            "`merge` merges the key sorted duration files in a single streaming pass "
+            "(bounded memory)."
+        ),
+    )
+    parser.add_argument(
+        "--jobs",
+        type=validate_jobs,
+        default=1,
+        help=(
+            "Number of repositories combined concurrently with --batch (0 uses all "
+            "cores)."
+        ),
+    )
+    parser.add_argument(
+        "--samples-file",
+        type=validate_file,
+        help=(
+            "Persisted per-test sample store, enables incremental updates where only "
+            "runs that have not been ingested before are read (requires "
+            "--aggregation=samples or --aggregation=streaming)."
+        ),
+    )
+    parser.add_argument(
+        "--max-samples",
+        type=int,
+        default=10,
+        help=(
+            "Number of samples the sample store averages over per test (older "
+            "samples decay exponentially), tests absent from this many runs are "
+            "pruned."
+        ),
+    )
+    parser.add_argument(
+        "--runs-manifest",
+        type=validate_file,
+        help=(
+            "Plain text manifest of already ingested run IDs (one per line), runs "
+            "listed here are skipped and newly ingested runs are appended."
+        ),
+    )
+    parser.add_argument(
+        "--estimator",
+        choices=sorted(ESTIMATORS),
+        default="mean",
+        help=(
+            "How to reduce the duration samples of a test into a single duration, "
+            "anything but `mean` requires --aggregation=samples or "
+            "--aggregation=columnar (without --samples-file)."
+        ),
+    )
+    parser.add_argument(
+        "--half-life",
+        type=float,
+        default=3.0,
+        help="Half-life (in runs) of the `ewma` estimator.",
+    )
+    parser.add_argument(
+        "--trim",
+        type=float,
+        default=0.1,
+        help="Proportion cut from each end by the `trimmed` estimator.",
+    )
+    parser.add_argument(
+        "--outliers",
+        choices=["none", *sorted(OUTLIER_FILTERS)],
+        default="none",
+        help=(
+            "Reject outlying duration samples per test before estimating, `mad` "
+            "(modified z-score) or `iqr` (Tukey's fences)."
+        ),
+    )
+    parser.add_argument(
+        "--outlier-threshold",
+        type=float,
+        help=(
+            "Rejection threshold, in MADs for `mad` (default: 3.5) or in "
+            "interquartile ranges beyond the quartiles for `iqr` (default: 1.5)."
+        ),
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=10,
+        help="Number of slowdowns/speedups listed in the drift report.",
+    )
     parser.add_argument(
-        "--artifacts-dir",
-        type=partial(validate_dir, writable=True),
-        required=True,
+        "--report-file",
+        type=validate_file,
+        help="Write the drift report (per-test old vs. new durations) as JSON.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help=(
+            "Also write the durations in the compact binary format "
+            "(<durations-dir>/<OS>.cdur), see CompactDurations."
+        ),
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help=(
+            "Precompute balanced test groups for this many shards per OS "
+            "(written to <durations-dir>/shards/<OS>.json)."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=None,
+        help=(
+            "Record wall time, CPU time, files & bytes read, and peak RSS per phase "
+            "(also enabled by COMBINE_DURATIONS_PROFILE=1/true/yes/on)."
+        ),
+    )
+    parser.add_argument(
+        "--profile-file",
+        type=validate_file,
+        help="Write the per phase profile as JSON to this file (implies --profile).",
+    )
+    args = parser.parse_args(argv)
+    if args.profile is None:
+        try:
+            args.profile = parse_bool(os.getenv("COMBINE_DURATIONS_PROFILE", ""))
+        except ValueError as err:
+            # ValueError: not a boolean
+            parser.error(f"COMBINE_DURATIONS_PROFILE: {err}")
+    args.profile = args.profile or bool(args.profile_file)
+    if args.batch:
+        # per repository options are defined in the manifest
+        if shared := [
+            option
+            for option in BATCH_OPTIONS
+            if getattr(args, option.replace("-", "_")) is not None
+        ] + (["profile-file"] if args.profile_file else []):
+            parser.error(f"--batch cannot be used with --{', --'.join(shared)}")
+    elif not (args.durations_dir and args.artifacts_dir):
+        parser.error("--durations-dir and --artifacts-dir are required (or --batch)")
+    if args.max_samples < 1:
+        parser.error(f"--max-samples must be at least 1, got {args.max_samples}")
+    if args.aggregation in ("columnar", "merge") and args.samples_file:
+        parser.error(
+            f"--aggregation={args.aggregation} cannot be used with --samples-file"
+        )
+    if args.estimator != "mean" and (
+        args.aggregation in ("streaming", "merge") or args.samples_file
+    ):
+        # running statistics only track the count & total
+        parser.error(
+            f"--estimator={args.estimator} requires --aggregation=samples or "
+            f"--aggregation=columnar (without --samples-file)"
+        )
+    if args.outliers != "none" and (
+        args.aggregation in ("streaming", "merge") or args.samples_file
+    ):
+        # running statistics only track the count & total
+        parser.error(
+            f"--outliers={args.outliers} requires --aggregation=samples or "
+            f"--aggregation=columnar (without --samples-file)"
+        )
+    return args
+
+
+@dataclass(slots=True)
+class RunningDuration:
+    """Running statistics for a single test, a constant-memory stand-in for the list
+    of samples.
+
+    The sum is tracked as a compensated (double-double) total so that `mean` matches
+    `statistics.fmean` over the same samples, the variance uses Welford's update.
+    """
+
+    count: int = 0
+    total: float = 0.0
+    compensation: float = 0.0
+    m2: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    @property
+    def variance(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return self.m2 / (self.count - 1)
+
+    def append(self, value: float) -> None:
+        previous = self.mean
+        self.count += 1
+
+        # exact error of the floating point addition (TwoSum)
+        total = self.total + value
+        rounded = total - self.total
+        error = (self.total - (total - rounded)) + (value - rounded)
+
+        # fold the accumulated error back into the total
+        compensation = self.compensation + error
+        self.total = total + compensation
+        self.compensation = compensation - (self.total - total)
+
+        # Welford's update of the sum of squared differences
+        self.m2 += (value - previous) * (value - self.mean)
+
+    def insert(self, index: int, value: float) -> None:
+        # the order of samples does not matter for running statistics
+        self.append(value)
+
+    def extend(self, other: RunningDuration) -> None:
+        if not other.count:
+            return
+        delta = other.mean - self.mean
+        count = self.count + other.count
+
+        # exact error of the floating point addition (TwoSum)
+        total = self.total + other.total
+        rounded = total - self.total
+        error = (self.total - (total - rounded)) + (other.total - rounded)
+
+        # fold both accumulated errors back into the total
+        compensation = self.compensation + other.compensation + error
+        self.total = total + compensation
+        self.compensation = compensation - (self.total - total)
+
+        # Chan et al.'s pairwise combination of the sum of squared differences
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+
+def average(values: Iterable[float] | RunningDuration) -> float:
+    if isinstance(values, RunningDuration):
+        return values.mean
+    return fmean(values)
+
+
+def estimate_memory(number_of_tests: int, name_length: int | None = None) -> int:
+    """Estimate the bytes retained by streaming aggregation for the given number of
+    tests (summed over all OSes).
+
+    Every test is held three times, the combined RunningDuration plus one in each of
+    the new & old DurationStats. The test names are only included when their average
+    (ASCII) `name_length` is given.
+    """
+    # a RunningDuration with its float fields (small counts are cached ints) plus a
+    # dict entry, i.e., the (hash, key, value) triplet and roughly two more words for
+    # the index table & slack (dicts are at most 2/3 full)
+    running = sys.getsizeof(RunningDuration()) + 3 * sys.getsizeof(0.0)
+    entry = running + 5 * struct.calcsize("P")
+    # the new durations share their names, the old durations have their own copies
+    names = 0 if name_length is None else 2 * (sys.getsizeof("") + name_length)
+    return number_of_tests * (3 * entry + names)
+
+
+def ewma(samples: NDArray[np.float64], half_life: float = 3.0, **kwargs) -> NDArray:
+    import numpy as np
+
+    # weights halve every `half_life` samples, counting back from the newest sample
+    weights = 0.5 ** (np.arange(samples.shape[1])[::-1] / half_life)
+    return samples @ weights / weights.sum()
+
+
+def trimmed_mean(samples: NDArray[np.float64], trim: float = 0.1, **kwargs) -> NDArray:
+    import numpy as np
+
+    count = samples.shape[1]
+    # always keep at least one (or the two middle) samples
+    cut = min(int(count * trim), (count - 1) // 2)
+    return np.sort(samples, axis=1)[:, cut : count - cut].mean(axis=1)
+
+
+def median(samples: NDArray[np.float64], **kwargs) -> NDArray:
+    import numpy as np
+
+    return np.median(samples, axis=1)
+
+
+def p90(samples: NDArray[np.float64], **kwargs) -> NDArray:
+    import numpy as np
+
+    return np.quantile(samples, 0.9, axis=1)
+
+
+ESTIMATORS: dict[str, Callable[..., NDArray] | None] = {
+    # None: fall back to the exact `statistics.fmean`
+    "mean": None,
+    "ewma": ewma,
+    "trimmed": trimmed_mean,
+    "median": median,
+    "p90": p90,
+}
+
+
+#: fewer samples than this are never rejected as outliers
+MIN_OUTLIER_SAMPLES = 3
+
+
+def mad_inliers(
+    samples: NDArray[np.float64],
+    threshold: float | None = None,
+) -> NDArray[np.bool_]:
+    import numpy as np
+
+    # modified z-score: distance from the median in (normal consistent) MADs
+    threshold = 3.5 if threshold is None else threshold
+    deviations = np.abs(samples - np.median(samples, axis=1, keepdims=True))
+    scale = 1.4826 * np.median(deviations, axis=1, keepdims=True)
+    # most samples are identical (MAD is 0), fall back to the mean absolute deviation
+    scale = np.where(scale > 0, scale, 1.2533 * deviations.mean(axis=1, keepdims=True))
+    return deviations <= threshold * scale
+
+
+def iqr_inliers(
+    samples: NDArray[np.float64],
+    threshold: float | None = None,
+) -> NDArray[np.bool_]:
+    import numpy as np
+
+    # Tukey's fences: within `threshold` interquartile ranges of the quartiles
+    threshold = 1.5 if threshold is None else threshold
+    q1, q3 = np.quantile(samples, [0.25, 0.75], axis=1, keepdims=True)
+    spread = threshold * (q3 - q1)
+    return (samples >= q1 - spread) & (samples <= q3 + spread)
+
+
+#: mask of the samples to keep (tests × samples) per outlier filter
+OUTLIER_FILTERS: dict[str, Callable[..., NDArray[np.bool_]]] = {
+    "mad": mad_inliers,
+    "iqr": iqr_inliers,
+}
+
+
+def group_by_count(os_combined: dict[str, list[float]]) -> dict[int, list[str]]:
+    # group tests by number of samples so each group is a dense (tests × samples) array
+    groups: dict[int, list[str]] = {}
+    for key, values in os_combined.items():
+        groups.setdefault(len(values), []).append(key)
+    return groups
+
+
+def reject_outliers(
+    os_combined: dict[str, list[float]] | ColumnarDurations,
+    method: str = "mad",
+    threshold: float | None = None,
+) -> tuple[dict[str, list[float]] | ColumnarDurations, int]:
+    """Drop the outlying duration samples of each test, returns the number rejected.
+
+    A single slow run (e.g., a network stall) otherwise inflates the estimate of every
+    test in that run until it ages out of the samples.
+    """
+    if isinstance(os_combined, ColumnarDurations):
+        return os_combined, os_combined.reject_outliers(method, threshold)
+
+    import numpy as np
+
+    function = OUTLIER_FILTERS[method]
+
+    filtered = dict(os_combined)
+    rejected = 0
+    for count, keys in group_by_count(os_combined).items():
+        if count < MIN_OUTLIER_SAMPLES:
+            continue
+        samples = np.array([os_combined[key] for key in keys], dtype=np.float64)
+        keep = function(samples, threshold)
+        # only the tests with rejected samples are replaced (order is preserved)
+        for index in np.flatnonzero(~keep.all(axis=1)).tolist():
+            filtered[keys[index]] = samples[index][keep[index]].tolist()
+        rejected += keep.size - int(keep.sum())
+    return filtered, rejected
+
+
+def estimate_durations(
+    os_combined: dict[str, list[float]]
+    | dict[str, RunningDuration]
+    | ColumnarDurations,
+    estimator: str = "mean",
+    **options: float,
+) -> dict[str, float]:
+    if isinstance(os_combined, ColumnarDurations):
+        return os_combined.estimate(estimator, **options)
+    elif not (function := ESTIMATORS[estimator]):
+        return {key: average(values) for key, values in os_combined.items()}
+
+    import numpy as np
+
+    estimates: dict[str, float] = {}
+    for keys in group_by_count(os_combined).values():
+        samples = np.array([os_combined[key] for key in keys], dtype=np.float64)
+        estimates.update(zip(keys, function(samples, **options).tolist()))
+    return estimates
 
 
 @dataclass
 class DurationStats:
-    tests: dict[str, set[float]] = field(default_factory=dict)
+    # every duration counts (a multiset), stored as running count/sum per test
+    tests: dict[str, RunningDuration] = field(default_factory=dict)
+    # running sum of the per-test means, kept up to date by add() and merge()
+    total_run_time: float = field(default=0.0, init=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.total_run_time = sum(duration.mean for duration in self.tests.values())
 
     @property
     def number_of_tests(self) -> int:
         return len(self.tests)
 
+    @property
+    def average_run_time(self) -> float:
+        if self.number_of_tests == 0:
+            return 0.0
+        return self.total_run_time / self.number_of_tests
+
+    def __iter__(self) -> Iterable[int, float]:
+        yield self.number_of_tests
+        yield self.total_run_time
+        yield self.average_run_time
+
+    def durations(self) -> dict[str, float]:
+        return {test: running.mean for test, running in self.tests.items()}
+
+    def add(self, data: dict[str, float]) -> None:
+        tests = self.tests
+        for test, duration in data.items():
+            try:
+                running = tests[test]
+            except KeyError:
+                # KeyError: first duration for this test
+                running = tests[test] = RunningDuration()
+            previous = running.mean
+            running.append(duration)
+            self.total_run_time += running.mean - previous
+
+    def merge(self, other: DurationStats) -> None:
+        tests = self.tests
+        for test, durations in other.tests.items():
+            try:
+                running = tests[test]
+            except KeyError:
+                # KeyError: first duration for this test
+                running = tests[test] = RunningDuration()
+            previous = running.mean
+            running.extend(durations)
+            self.total_run_time += running.mean - previous
+
+
+class ColumnarDurations:
+    """Duration samples of a single OS in columnar form.
+
+    Test IDs are interned to integer indices and every sample is appended to
+    contiguous arrays, so statistics and estimators are computed vectorized over all
+    tests instead of per test. Mirrors the `DurationStats` interface.
+    """
+
+    def __init__(self) -> None:
+        self.index: dict[str, int] = {}
+        self.ids = array("I")
+        self.values = array("d")
+        # 0 for previous durations (the oldest sample), 1 for new durations
+        self.newer = array("B")
+
+    def add(self, data: dict[str, float], oldest: bool = False) -> None:
+        index = self.index
+        self.ids.extend([index.setdefault(key, len(index)) for key in data])
+        self.values.extend(data.values())
+        self.newer.frombytes(bytes([not oldest]) * len(data))
+
+    def extend(self, other: ColumnarDurations) -> None:
+        import numpy as np
+
+        index = self.index
+        remap = np.array(
+            [index.setdefault(key, len(index)) for key in other.index],
+            dtype=np.uint32,
+        )
+        ids = np.frombuffer(other.ids, dtype=np.uint32)
+        self.ids.frombytes(remap[ids].tobytes())
+        self.values.extend(other.values)
+        self.newer.extend(other.newer)
+
+    def copy(self) -> ColumnarDurations:
+        copy = ColumnarDurations()
+        copy.index = dict(self.index)
+        copy.ids = array("I", self.ids)
+        copy.values = array("d", self.values)
+        copy.newer = array("B", self.newer)
+        return copy
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def keys(self) -> list[str]:
+        # dicts preserve insertion order, i.e., keys are ordered by their index
+        return list(self.index)
+
+    def _counts_sums(self) -> tuple[NDArray[np.intp], NDArray[np.float64]]:
+        import numpy as np
+
+        ids = np.frombuffer(self.ids, dtype=np.uint32)
+        values = np.frombuffer(self.values, dtype=np.float64)
+        counts = np.bincount(ids, minlength=len(self.index))
+        sums = np.bincount(ids, weights=values, minlength=len(self.index))
+        return counts, sums
+
+    def _positions(self) -> Iterator[tuple[NDArray[np.intp], NDArray[np.intp]]]:
+        import numpy as np
+
+        # yield (test indices, tests × samples positions in the arrays) for each
+        # distinct sample count, samples are ordered chronologically (previous
+        # durations first)
+        ids = np.frombuffer(self.ids, dtype=np.uint32)
+        newer = np.frombuffer(self.newer, dtype=np.uint8)
+        order = np.lexsort((newer, ids))
+        counts = np.bincount(ids, minlength=len(self.index))
+        starts = np.cumsum(counts) - counts
+        for count in np.unique(counts[counts > 0]):
+            tests = np.flatnonzero(counts == count)
+            yield tests, order[starts[tests, None] + np.arange(count)]
+
+    def grouped(self) -> Iterator[tuple[NDArray[np.intp], NDArray[np.float64]]]:
+        import numpy as np
+
+        # yield (test indices, tests × samples array) for each distinct sample count
+        values = np.frombuffer(self.values, dtype=np.float64)
+        for tests, positions in self._positions():
+            yield tests, values[positions]
+
+    def reject_outliers(
+        self, method: str = "mad", threshold: float | None = None
+    ) -> int:
+        import numpy as np
+
+        function = OUTLIER_FILTERS[method]
+        values = np.frombuffer(self.values, dtype=np.float64)
+        keep = np.ones(len(values), dtype=bool)
+        for _, positions in self._positions():
+            if positions.shape[1] >= MIN_OUTLIER_SAMPLES:
+                keep[positions] = function(values[positions], threshold)
+
+        if rejected := len(keep) - int(keep.sum()):
+            # every test keeps at least one sample, so the index is unchanged
+            for name, typecode, dtype in (
+                ("ids", "I", np.uint32),
+                ("values", "d", np.float64),
+                ("newer", "B", np.uint8),
+            ):
+                column = array(typecode)
+                column.frombytes(
+                    np.frombuffer(getattr(self, name), dtype=dtype)[keep].tobytes()
+                )
+                setattr(self, name, column)
+        return rejected
+
+    def estimate(self, estimator: str = "mean", **options: float) -> dict[str, float]:
+        if not (function := ESTIMATORS[estimator]):
+            counts, sums = self._counts_sums()
+            estimates = sums / counts
+        else:
+            import numpy as np
+
+            estimates = np.empty(len(self.index))
+            for tests, samples in self.grouped():
+                estimates[tests] = function(samples, **options)
+        return dict(zip(self.index, estimates.tolist()))
+
+    def durations(self) -> dict[str, float]:
+        return self.estimate()
+
+    @property
+    def number_of_tests(self) -> int:
+        return len(self.index)
+
     @property
     def total_run_time(self) -> float:
-        return sum(fmean(values) for values in self.tests.values())
+        if not self.index:
+            return 0.0
+        counts, sums = self._counts_sums()
+        return float((sums / counts).sum())
 
     @property
     def average_run_time(self) -> float:
@@ -75,12 +830,64 @@ class DurationStats:
         yield self.total_run_time
         yield self.average_run_time
 
-    def add(self, data: dict[str, float]) -> None:
-        for test, duration in data.items():
-            self.tests.setdefault(test, set()).add(duration)
+
+STATS_MAP = dict[str, "DurationStats | ColumnarDurations | MergedStats"]
 
 
-STATS_MAP = dict[str, DurationStats]
+def peak_rss() -> int | None:
+    # peak resident set size (in bytes) of this process so far
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def cpu_time() -> float:
+    # user & system time of this process and its (terminated) worker processes
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+@dataclass
+class Profiler:
+    """Opt-in resource usage per phase of combine-durations.
+
+    Files & bytes read are always counted (see `count`), the phases are only recorded
+    when enabled.
+    """
+
+    enabled: bool = False
+    phases: dict[str, dict[str, float | int | None]] = field(default_factory=dict)
+    files: int = 0
+    bytes: int = 0
+
+    def count(self, content: bytes, files: int = 1) -> bytes:
+        self.files += files
+        self.bytes += len(content)
+        return content
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        wall, cpu = perf_counter(), cpu_time()
+        files, read = self.files, self.bytes
+        try:
+            yield
+        finally:
+            self.phases[name] = {
+                "wall": perf_counter() - wall,
+                "cpu": cpu_time() - cpu,
+                "files": self.files - files,
+                "bytes": self.bytes - read,
+                "peak_rss": peak_rss(),
+            }
+
+
+PROFILER = Profiler()
 
 
 def read_durations(
@@ -88,7 +895,7 @@ def read_durations(
     stats: STATS_MAP,
 ) -> tuple[str, dict[str, float]]:
     os_name = path.stem
-    data = json.loads(path.read_text())
+    data = json_loads(PROFILER.count(path.read_bytes()))
 
     # update durations stats
     stats.setdefault(os_name, DurationStats()).add(data)
@@ -96,27 +903,133 @@ def read_durations(
     return os_name, data
 
 
-def aggregate_new_durations(artifacts_dir: Path) -> tuple[COMBINED_TYPE, STATS_MAP]:
-    combined: COMBINED_TYPE = {}
+def get_run_id(artifacts_dir: Path, path: Path) -> str | None:
+    # artifacts are downloaded into one directory per run: <artifacts_dir>/<run_id>/...
+    parts = path.relative_to(artifacts_dir).parts
+    return parts[0] if len(parts) > 1 else None
+
+
+def find_runs(artifacts_dir: Path) -> set[str]:
+    return {
+        run_id
+        for path in artifacts_dir.glob("*/**/*.json")
+        if (run_id := get_run_id(artifacts_dir, path))
+    }
+
+
+def sort_run(run: str) -> tuple[int, str]:
+    # run IDs are increasing numbers, compare by length first to sort them numerically
+    return len(run), run
+
+
+def recent_runs(runs: Iterable[str], limit: int | None = None) -> list[str]:
+    runs = sorted(runs, key=sort_run)
+    return runs[-limit:] if limit else runs
+
+
+def read_manifest(path: Path) -> set[str]:
+    try:
+        return set(path.read_text().split())
+    except FileNotFoundError:
+        # FileNotFoundError: nothing has been ingested yet
+        return set()
+
+
+def write_manifest(path: Path, runs: Iterable[str]) -> None:
+    # only remember the most recent runs, older runs will not be downloaded again
+    path.write_text("".join(f"{run}\n" for run in recent_runs(runs, RUNS_LIMIT)))
+
+
+def print_removed(
+    os_name: str,
+    names: Collection[str],
+    limit: int = REMOVED_LIMIT,
+    total: int | None = None,
+) -> None:
+    # a single warning per OS with a capped, collapsible list of the removed tests so
+    # renaming thousands of tests doesn't flood the log & summary, `total` is the
+    # number of removed tests when only (at least `limit` of) the names are given
+    if not names:
+        return
+    total = len(names) if total is None else total
+    print(f"⚠️ {os_name}: {total} tests not present in new durations, removing")
+    listed = "".join(f"- {os_name}::{name}\n" for name in nsmallest(limit, names))
+    if total > limit:
+        listed += f"- ... and {total - limit} more\n"
+    print(
+        f"<details>\n"
+        f"<summary>Removed tests ({os_name})</summary>\n"
+        f"\n"
+        f"{listed}"
+        f"\n"
+        f"</details>",
+        # test IDs contain brackets (parametrized tests) which aren't markup
+        markup=False,
+        highlight=False,
+    )
+
+
+def insert_durations(
+    combined: COMBINED_TYPE | STREAMING_TYPE,
+    os_name: str,
+    data: dict[str, float],
+    streaming: bool = False,
+) -> None:
+    samples = RunningDuration if streaming else list
+    os_combined = combined.setdefault(os_name, {})
+    for key, value in data.items():
+        os_combined.setdefault(key, samples()).append(value)
+
+
+def find_artifacts(
+    artifacts_dir: Path,
+    exclude: Container[str] = frozenset(),
+) -> list[Path]:
+    runs = {
+        path: get_run_id(artifacts_dir, path)
+        for path in artifacts_dir.glob("**/*.json")
+    }
+    return sorted(
+        # skip runs that have already been ingested
+        (path for path, run in runs.items() if run not in exclude),
+        # oldest to newest run so samples are in chronological order
+        key=lambda path: (*sort_run(runs[path] or ""), path),
+    )
+
+
+def read_artifacts(paths: Sequence[Path]) -> Iterator[tuple[str, bytes]]:
+    # yields (OS, content) in order, the artifacts are read & parsed sequentially
+    # (neither reading ahead in threads nor parsing in worker processes was faster,
+    # see the benchmarks in the README)
+    for path in paths:
+        yield path.stem, PROFILER.count(path.read_bytes())
+
+
+def aggregate_new_durations(
+    artifacts_dir: Path,
+    streaming: bool = False,
+    exclude: Container[str] = frozenset(),
+) -> tuple[COMBINED_TYPE | STREAMING_TYPE, STATS_MAP]:
+    combined: COMBINED_TYPE | STREAMING_TYPE = {}
 
     new_stats: dict[str, DurationStats] = {}
-    for path in artifacts_dir.glob("**/*.json"):
+    paths = find_artifacts(artifacts_dir, exclude)
+    for os_name, content in read_artifacts(paths):
         # read new durations
-        os_name, new_data = read_durations(path, new_stats)
+        new_data = json_loads(content)
+        new_stats.setdefault(os_name, DurationStats()).add(new_data)
 
         # insert new durations
-        os_combined = combined.setdefault(os_name, {})
-        for key, value in new_data.items():
-            os_combined.setdefault(key, []).append(value)
+        insert_durations(combined, os_name, new_data, streaming)
 
     return combined, new_stats
 
 
 def aggregate_old_durations(
     durations_dir: Path,
-    combined: COMBINED_TYPE,
+    combined: COMBINED_TYPE | STREAMING_TYPE,
     unlink: bool = True,
-) -> tuple[COMBINED_TYPE, STATS_MAP]:
+) -> tuple[COMBINED_TYPE | STREAMING_TYPE, STATS_MAP]:
     combined = combined or {}
 
     old_stats: dict[str, DurationStats] = {}
@@ -135,15 +1048,924 @@ def aggregate_old_durations(
                 print(f"⚠️ {os_name} not present in new durations, skipping")
             continue
 
+        # only copy over keys that are still present in new durations, a single
+        # pass over the old durations instead of building intersection/difference sets
+        removed = []
+        for key, value in old_data.items():
+            try:
+                # previous durations are the oldest sample
+                os_combined[key].insert(0, value)
+            except KeyError:
+                # KeyError: test no longer present
+                removed.append(key)
+
         # warn about tests that are no longer present
-        for name in set(old_data) - set(combined[os_name]):
-            print(f"⚠️ {os_name}::{name} not present in new durations, removing")
+        print_removed(os_name, removed)
+
+    return combined, old_stats
+
+
+def aggregate_columnar_durations(
+    artifacts_dir: Path,
+    durations_dir: Path,
+    exclude: Container[str] = frozenset(),
+    unlink: bool = True,
+) -> tuple[COLUMNAR_TYPE, STATS_MAP, STATS_MAP]:
+    # new durations
+    new_stats: COLUMNAR_TYPE = {}
+    paths = find_artifacts(artifacts_dir, exclude)
+    for os_name, content in read_artifacts(paths):
+        new_stats.setdefault(os_name, ColumnarDurations()).add(json_loads(content))
+    combined = {os_name: columns.copy() for os_name, columns in new_stats.items()}
+
+    # old durations
+    old_stats: COLUMNAR_TYPE = {}
+    for path in durations_dir.glob("*.json"):
+        os_name = path.stem
+        old_data = json_loads(PROFILER.count(path.read_bytes()))
+        old_stats[os_name] = ColumnarDurations()
+        old_stats[os_name].add(old_data)
+
+        try:
+            os_combined = combined[os_name]
+        except KeyError:
+            # KeyError: OS not present in new durations
+            if unlink:
+                print(f"⚠️ {os_name} not present in new durations, removing")
+                path.unlink()
+            else:
+                print(f"⚠️ {os_name} not present in new durations, skipping")
+            continue
+
+        # warn about tests that are no longer present
+        print_removed(os_name, old_data.keys() - os_combined.index.keys())
 
         # only copy over keys that are still present in new durations
-        for key in set(old_data) & set(combined[os_name]):
-            os_combined[key].append(old_data[key])
+        os_combined.add(
+            {key: value for key, value in old_data.items() if key in os_combined},
+            oldest=True,
+        )
 
-    return combined, old_stats
+    return combined, new_stats, old_stats
+
+
+@dataclass
+class SampleStore:
+    """Compact on-disk store of the per-test sample count & total alongside the run IDs
+    that have already been ingested.
+
+    Only the count, total, and the last run a test was seen in are persisted
+    (`{"OS": {"test": [count, total, run]}}`), so the variance of a `RunningDuration`
+    does not survive a round trip.
+    """
+
+    runs: set[str] = field(default_factory=set)
+    durations: STREAMING_TYPE = field(default_factory=dict)
+    # last run each test was seen in, tests are pruned once outside the window
+    seen: dict[str, dict[str, str]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path, durations_dir: Path | None = None) -> SampleStore:
+        try:
+            data = json_loads(PROFILER.count(path.read_bytes()))
+        except FileNotFoundError:
+            # FileNotFoundError: first incremental run, start from the previous
+            # durations (if any) so the history isn't dropped
+            return cls.seed(durations_dir) if durations_dir else cls()
+        # stores written before the last run was tracked count as seen in the latest run
+        latest = max(data["runs"], key=sort_run, default="")
+        return cls(
+            runs=set(data["runs"]),
+            durations={
+                os_name: {
+                    test: RunningDuration(count=entry[0], total=entry[1])
+                    for test, entry in tests.items()
+                }
+                for os_name, tests in data["durations"].items()
+            },
+            seen={
+                os_name: {
+                    test: (entry[2:] or [latest])[0] for test, entry in tests.items()
+                }
+                for os_name, tests in data["durations"].items()
+            },
+        )
+
+    @classmethod
+    def seed(cls, durations_dir: Path) -> SampleStore:
+        # previous durations count as a single sample, the run they were last seen in
+        # is unknown so they are pruned as soon as they are missing from a new run
+        store = cls()
+        for path in sorted(durations_dir.glob("*.json")):
+            os_name = path.stem
+            data = json_loads(PROFILER.count(path.read_bytes()))
+            store.durations[os_name] = {
+                test: RunningDuration(count=1, total=duration)
+                for test, duration in data.items()
+            }
+            store.seen[os_name] = dict.fromkeys(data, "")
+        if store.durations:
+            print(
+                f"ℹ️ Seeding the sample store from the previous durations "
+                f"({', '.join(store.durations)})",
+                highlight=False,
+            )
+        return store
+
+    def dump(self, path: Path) -> None:
+        # only remember the most recent runs, older runs will not be downloaded again
+        runs = recent_runs(self.runs, RUNS_LIMIT)
+        durations = {
+            os_name: {
+                test: [
+                    duration.count,
+                    duration.total,
+                    self.seen.get(os_name, {}).get(test, ""),
+                ]
+                for test, duration in tests.items()
+            }
+            for os_name, tests in self.durations.items()
+        }
+        path.write_text(
+            json.dumps(
+                {"runs": runs, "durations": durations},
+                separators=(",", ":"),
+                sort_keys=True,
+            )
+            + "\n"  # include trailing newline
+        )
+
+    def update(
+        self,
+        combined: STREAMING_TYPE,
+        runs: Iterable[str],
+        max_samples: int = 10,
+    ) -> None:
+        runs = set(runs)
+        self.runs.update(runs)
+        latest = max(runs, key=sort_run, default="")
+        # a test is only pruned once absent from the last `max_samples` runs
+        window = set(recent_runs(self.runs, max_samples))
+        for os_name, os_combined in combined.items():
+            os_store = self.durations.setdefault(os_name, {})
+            os_seen = self.seen.setdefault(os_name, {})
+
+            # warn about tests that are no longer present
+            removed = [
+                name
+                for name in os_store.keys() - os_combined.keys()
+                if os_seen.get(name) not in window
+            ]
+            for name in removed:
+                del os_store[name]
+                os_seen.pop(name, None)
+            print_removed(os_name, removed)
+
+            for test, samples in os_combined.items():
+                duration = os_store.setdefault(test, RunningDuration())
+                duration.extend(samples)
+                os_seen[test] = latest
+
+                # past `max_samples` the count & total are scaled back down, i.e., an
+                # exponential decay rather than a sliding window (a count & total
+                # cannot forget a specific sample): each new sample weighs
+                # 1/(max_samples + 1) and the older samples fade accordingly
+                if duration.count > max_samples:
+                    duration.total *= max_samples / duration.count
+                    duration.compensation *= max_samples / duration.count
+                    duration.count = max_samples
+
+
+def aggregate_stored_durations(
+    durations_dir: Path,
+    store: SampleStore,
+    unlink: bool = True,
+) -> STATS_MAP:
+    old_stats: dict[str, DurationStats] = {}
+    for path in durations_dir.glob("*.json"):
+        # read old durations
+        os_name, _ = read_durations(path, old_stats)
+
+        if os_name not in store.durations:
+            # OS not present in the sample store
+            if unlink:
+                print(f"⚠️ {os_name} not present in sample store, removing")
+                path.unlink()
+            else:
+                print(f"⚠️ {os_name} not present in sample store, skipping")
+
+    return old_stats
+
+
+def dump_durations(data: dict[str, float]) -> str:
+    # byte for byte identical to `json.dumps(data, indent=4, sort_keys=True) + "\n"`
+    # without falling back to json's pure Python encoder (used whenever indent is set)
+    if not all(map(isfinite, data.values())):
+        # NaN/Infinity use json's spelling, not Python's repr
+        return json.dumps(data, indent=4, sort_keys=True) + "\n"
+    elif not data:
+        return "{}\n"
+    lines = ",\n    ".join(
+        [f"{encode_basestring_ascii(key)}: {data[key]!r}" for key in sorted(data)]
+    )
+    return f"{{\n    {lines}\n}}\n"
+
+
+#: JSON literals for the non-finite floats
+CONSTANTS = {"NaN": nan, "Infinity": inf, "-Infinity": -inf}
+
+#: fast path for a complete `"test": number,` pair without escapes
+PAIR_RE = re.compile(
+    r'[ \t\n\r]*"([^"\\\x00-\x1f]*)"[ \t\n\r]*:[ \t\n\r]*'
+    r"(-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?)[ \t\n\r]*([,}])"
+)
+
+
+def iter_durations(path: Path, chunk_size: int = 2**16) -> Iterator[tuple[str, float]]:
+    """Incrementally parse a flat JSON object of durations, yields (test, duration).
+
+    Only `chunk_size` bytes (plus an incomplete token) are held in memory at a time.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, eof = "", 0, False
+    # "{" then ("key" ":" "value" ("," | "}"))* with "first" allowing an empty object
+    expected = "{"
+    key: str | None = None
+    with path.open("rb") as fh:
+        PROFILER.count(b"")
+        while True:
+            if expected in ("first", "key") and (match := PAIR_RE.match(buffer, pos)):
+                key, value, terminator = match.group(1, 2, 3)
+                yield key, float(value)
+                if terminator == "}":
+                    return
+                pos, expected = match.end(), "key"
+                continue
+
+            pos = WHITESPACE.match(buffer, pos).end()
+
+            token: str | float | None = None
+            end = pos
+            is_key = False
+            if pos == len(buffer):
+                if eof:
+                    raise JSONDecodeError("Unexpected end of file", buffer, pos)
+            elif expected in ("first", "key") and buffer[pos] == '"':
+                try:
+                    token, end = scanstring(buffer, pos + 1)
+                    is_key = True
+                except JSONDecodeError:
+                    # JSONDecodeError: string continues in the next chunk
+                    if eof:
+                        raise
+            elif expected == "value":
+                if match := NUMBER_RE.match(buffer, pos):
+                    token, end = float(match.group()), match.end()
+                for literal, value in CONSTANTS.items():
+                    if buffer.startswith(literal, pos):
+                        token, end = value, pos + len(literal)
+                if token is None and (eof or len(buffer) - pos > len("-Infinity")):
+                    raise JSONDecodeError("Expecting value", buffer, pos)
+                elif not eof and (
+                    end == len(buffer) or buffer[end] in "+-.0123456789eE"
+                ):
+                    # a number (or literal) at the end of the buffer may continue
+                    token = None
+            elif buffer[pos] in {"{": "{", "first": "}", ":": ":", ",}": ",}"}.get(
+                expected, ""
+            ):
+                token, end = buffer[pos], pos + 1
+            else:
+                raise JSONDecodeError(f"Expecting {expected!r}", buffer, pos)
+
+            if token is None:
+                # read the next chunk, keeping the incomplete token
+                chunk = PROFILER.count(fh.read(chunk_size), files=0)
+                eof = not chunk
+                buffer = buffer[pos:] + decoder.decode(chunk, final=eof)
+                pos = 0
+                continue
+            pos = end
+
+            if expected == "{":
+                expected = "first"
+            elif is_key:
+                key, expected = token, ":"
+            elif expected == ":":
+                expected = "value"
+            elif expected == "value":
+                yield key, token
+                expected = ",}"
+            elif token == ",":
+                expected = "key"
+            else:
+                # closing "}" of an empty or complete object
+                return
+
+
+def format_duration(value: float) -> str:
+    # same spelling as json.dumps, i.e., repr for finite floats and NaN/Infinity
+    return repr(value) if isfinite(value) else json.dumps(value)
+
+
+def write_durations(path: Path, durations: Iterable[tuple[str, float]]) -> None:
+    # streaming counterpart of `dump_durations` (identical output) for sorted items
+    with path.open("w") as fh:
+        separator = "{\n    "
+        for key, value in durations:
+            fh.write(
+                f"{separator}{encode_basestring_ascii(key)}: {format_duration(value)}"
+            )
+            separator = ",\n    "
+        fh.write("{}\n" if separator == "{\n    " else "\n}\n")
+
+
+def iter_samples(path: Path, source: int) -> Iterator[tuple[str, int, float]]:
+    # yields (test, source, duration) and checks the file is sorted by test
+    previous = None
+    for key, value in iter_durations(path):
+        if previous is not None and key <= previous:
+            raise ValueError(
+                f"{path} is not sorted by key ({previous!r} before {key!r}), "
+                f"use a different --aggregation"
+            )
+        previous = key
+        yield key, source, value
+
+
+@dataclass
+class MergedStats:
+    """Number of tests & total run time without keeping the tests in memory."""
+
+    number_of_tests: int = 0
+    total_run_time: float = 0.0
+
+    @property
+    def average_run_time(self) -> float:
+        if self.number_of_tests == 0:
+            return 0.0
+        return self.total_run_time / self.number_of_tests
+
+    def __iter__(self) -> Iterable[int, float]:
+        yield self.number_of_tests
+        yield self.total_run_time
+        yield self.average_run_time
+
+    def add(self, duration: float) -> None:
+        self.number_of_tests += 1
+        self.total_run_time += duration
+
+
+def merge_durations(
+    artifacts_dir: Path,
+    durations_dir: Path,
+    exclude: Container[str] = frozenset(),
+    unlink: bool = True,
+    top: int = 10,
+) -> tuple[dict[str, MergedStats], dict[str, MergedStats], Drift]:
+    """Combine the key sorted duration files with a k-way merge.
+
+    Equivalent to `aggregate_new_durations` & `aggregate_old_durations` followed by
+    writing the mean durations, but every file is streamed, so memory is bounded by
+    the number of files per OS instead of the number of tests.
+    """
+    sources: dict[str, list[Path]] = {}
+    for path in find_artifacts(artifacts_dir, exclude):
+        sources.setdefault(path.stem, []).append(path)
+
+    new_stats: dict[str, MergedStats] = {}
+    old_stats: dict[str, MergedStats] = {}
+    drift = Drift(top)
+
+    for path in sorted(durations_dir.glob("*.json")):
+        if (os_name := path.stem) in sources:
+            continue
+        # OS not present in new durations
+        old_stats[os_name] = stats = MergedStats()
+        for _, duration in iter_durations(path):
+            stats.add(duration)
+        if unlink:
+            print(f"⚠️ {os_name} not present in new durations, removing")
+            path.unlink()
+        else:
+            print(f"⚠️ {os_name} not present in new durations, skipping")
+
+    for os_name in sorted(sources):
+        paths = sources[os_name]
+        new = new_stats[os_name] = MergedStats()
+        # previous durations are the oldest sample (source 0)
+        streams = [iter_samples(path, source) for source, path in enumerate(paths, 1)]
+        if (old_path := durations_dir / f"{os_name}.json").exists():
+            old = old_stats[os_name] = MergedStats()
+            counts = drift.add_os(os_name)
+            streams.insert(0, iter_samples(old_path, 0))
+        removed: list[str] = []
+
+        def combined() -> Iterator[tuple[str, float]]:
+            for key, group in groupby(merge(*streams), key=itemgetter(0)):
+                samples = [(source, duration) for _, source, duration in group]
+                previous = None
+                if samples[0][0] == 0:
+                    previous = samples[0][1]
+                    old.add(previous)
+                    if len(samples) == 1:
+                        # test is no longer present, keys are visited in sorted order
+                        # so the first few are the ones listed by `print_removed`
+                        counts["removed"] += 1
+                        if len(removed) < REMOVED_LIMIT:
+                            removed.append(key)
+                        continue
+
+                new.add(average(duration for source, duration in samples if source))
+                estimate = average(duration for _, duration in samples)
+                if previous is not None:
+                    drift.add(os_name, key, previous, estimate)
+                elif os_name in drift.oses:
+                    counts["added"] += 1
+                yield key, estimate
+
+        # write next to the previous durations, which are still being read
+        tmp_path = durations_dir / f"{os_name}.json.tmp"
+        try:
+            write_durations(tmp_path, combined())
+        except BaseException:
+            # BaseException: e.g., an unsorted file, leave the previous durations as is
+            tmp_path.unlink(missing_ok=True)
+            raise
+        tmp_path.replace(old_path)
+
+        # warn about tests that are no longer present
+        if removed:
+            print_removed(os_name, removed, total=counts["removed"])
+
+    return new_stats, old_stats, drift
+
+
+@dataclass
+class Drift:
+    """Running drift report, per-test changes are added one at a time.
+
+    Only the top-N slowdowns & speedups are kept (bounded heaps whose root is the
+    least significant entry kept so far), see `compute_drift`.
+    """
+
+    top: int = 10
+    oses: dict[str, dict[str, Any]] = field(default_factory=dict)
+    slowdowns: list[tuple[float, str, str, float, float]] = field(default_factory=list)
+    speedups: list[tuple[float, str, str, float, float]] = field(default_factory=list)
+
+    def add_os(self, os_name: str) -> dict[str, Any]:
+        return self.oses.setdefault(os_name, {"added": 0, "removed": 0, "delta": 0.0})
+
+    def add(self, os_name: str, test: str, old: float, new: float) -> None:
+        delta = new - old
+        self.oses[os_name]["delta"] += delta
+        if self.top <= 0:
+            return
+        elif len(self.slowdowns) < self.top:
+            heappush(self.slowdowns, (delta, os_name, test, old, new))
+            heappush(self.speedups, (-delta, os_name, test, old, new))
+        else:
+            heappushpop(self.slowdowns, (delta, os_name, test, old, new))
+            heappushpop(self.speedups, (-delta, os_name, test, old, new))
+
+    def report(self) -> dict[str, Any]:
+        def entries(heap: list[tuple[float, str, str, float, float]], sign: int):
+            return [
+                {
+                    "os": os_name,
+                    "test": test,
+                    "old": old,
+                    "new": new,
+                    "delta": sign * delta,
+                }
+                for delta, os_name, test, old, new in sorted(heap, reverse=True)
+                if delta > 0
+            ]
+
+        return {
+            "oses": self.oses,
+            "slowdowns": entries(self.slowdowns, +1),
+            "speedups": entries(self.speedups, -1),
+        }
+
+
+def compute_drift(
+    old: dict[str, dict[str, float]],
+    new: dict[str, dict[str, float]],
+    top: int = 10,
+) -> dict[str, Any]:
+    drift = Drift(top)
+    for os_name in sorted(old.keys() & new.keys()):
+        os_old = old[os_name]
+        os_new = new[os_name]
+        counts = drift.add_os(os_name)
+        for test in os_old.keys() & os_new.keys():
+            drift.add(os_name, test, os_old[test], os_new[test])
+        counts["added"] = len(os_new.keys() - os_old.keys())
+        counts["removed"] = len(os_old.keys() - os_new.keys())
+    return drift.report()
+
+
+def print_drift(report: dict[str, Any]) -> None:
+    for key, title in (("slowdowns", "Slowdowns"), ("speedups", "Speedups")):
+        if not (entries := report[key]):
+            continue
+        print(f"Top {len(entries)} {title.lower()}")
+        table = Table(box=box.MARKDOWN)
+        table.add_column("OS")
+        table.add_column("Test")
+        table.add_column("Old (sec)")
+        table.add_column("New (sec)")
+        table.add_column("Delta (sec)")
+        for entry in entries:
+            table.add_row(
+                entry["os"],
+                # test IDs contain brackets (parametrized tests) which aren't markup
+                Text(f"`{entry['test']}`"),
+                f"{entry['old']:.2f}",
+                f"{entry['new']:.2f}",
+                f"{entry['delta']:+.2f}",
+            )
+        print(table)
+
+
+def write_report(report: dict[str, Any], path: Path) -> None:
+    path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def dump_report(report: dict[str, Any], path: Path | None = None) -> None:
+    if path:
+        write_report(report, path)
+    # dump compact report to GitHub Actions output
+    if output := os.getenv("GITHUB_OUTPUT"):
+        with Path(output).open("a") as fh:
+            fh.write(f"report={json.dumps(report, separators=(',', ':'))}\n")
+
+
+def partition_durations(
+    durations: dict[str, float],
+    shards: int,
+) -> tuple[list[list[str]], list[float]]:
+    # longest-processing-time first: assign each test (slowest first) to the shard
+    # with the least predicted time so far, a min-heap of (time, shard)
+    groups: list[list[str]] = [[] for _ in range(shards)]
+    loads = [(0.0, shard) for shard in range(shards)]
+    for test in sorted(durations, key=lambda test: (-durations[test], test)):
+        load, shard = loads[0]
+        groups[shard].append(test)
+        heapreplace(loads, (load + durations[test], shard))
+
+    makespans = [0.0] * shards
+    for load, shard in loads:
+        makespans[shard] = load
+    return [sorted(group) for group in groups], makespans
+
+
+def write_shards(
+    durations_dir: Path,
+    os_name: str,
+    groups: list[list[str]],
+    makespans: list[float],
+) -> None:
+    # a subdirectory so the groups are not mistaken for duration files
+    shards_dir = durations_dir / "shards"
+    shards_dir.mkdir(exist_ok=True)
+    (shards_dir / f"{os_name}.json").write_text(
+        json.dumps(
+            {"groups": groups, "makespans": makespans, "shards": len(groups)},
+            indent=4,
+            sort_keys=True,
+        )
+        + "\n"  # include trailing newline
+    )
+
+
+def print_shards(shards: dict[str, tuple[list[list[str]], list[float]]]) -> None:
+    table = Table(box=box.MARKDOWN)
+    table.add_column("OS")
+    table.add_column("Shard")
+    table.add_column("Number of tests")
+    table.add_column("Predicted run time (min)")
+    for os_name, (groups, makespans) in sorted(shards.items()):
+        slowest = max(makespans)
+        for shard, (group, makespan) in enumerate(zip(groups, makespans), start=1):
+            marker = " (makespan)" if makespan == slowest else ""
+            table.add_row(
+                os_name,
+                f"{shard}/{len(groups)}",
+                str(len(group)),
+                f"{makespan / 60:.2f}{marker}",
+            )
+    print(table)
+
+
+#: compact durations header: magic, version, number of tests, restart interval, and
+#: size of the keys blob; followed by float32 durations, uint32 restart offsets
+#: (into the keys blob), and the prefix compressed keys (all little endian)
+COMPACT_HEADER = struct.Struct("<4sIIII")
+COMPACT_MAGIC = b"CDUR"
+COMPACT_VERSION = 1
+
+
+def encode_varint(value: int) -> bytes:
+    encoded = bytearray()
+    while value >= 0x80:
+        encoded.append(value & 0x7F | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_varint(buffer: bytes | mmap.mmap, offset: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def write_compact(path: Path, durations: dict[str, float], interval: int = 16) -> None:
+    # keys are sorted and stored as (shared prefix length, suffix) relative to the
+    # previous key, every `interval` keys a full key is stored as a restart point
+    keys = bytearray()
+    restarts = array("I")
+    previous = b""
+    for i, key in enumerate(encoded := sorted(key.encode() for key in durations)):
+        if i % interval == 0:
+            restarts.append(len(keys))
+            shared = 0
+        else:
+            shared = len(os.path.commonprefix((previous, key)))
+        keys += encode_varint(shared)
+        keys += encode_varint(len(key) - shared)
+        keys += key[shared:]
+        previous = key
+    values = array("f", (durations[key.decode()] for key in encoded))
+    if sys.byteorder == "big":
+        # arrays are written in native byte order, the format is little endian
+        values.byteswap()
+        restarts.byteswap()
+
+    with path.open("wb") as fh:
+        fh.write(
+            COMPACT_HEADER.pack(
+                COMPACT_MAGIC, COMPACT_VERSION, len(values), interval, len(keys)
+            )
+        )
+        fh.write(values.tobytes())
+        fh.write(restarts.tobytes())
+        fh.write(keys)
+
+
+class CompactDurations(Mapping[str, float]):
+    """Read-only, memory-mapped view of a compact durations file.
+
+    Lookups binary search the restart points and decode at most one block of keys,
+    so nothing is parsed up front.
+    """
+
+    def __init__(self, path: str | os.PathLike[str] | Path) -> None:
+        with Path(path).open("rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, interval, size = COMPACT_HEADER.unpack_from(self._mmap)
+        if magic != COMPACT_MAGIC or version != COMPACT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a compact durations file")
+
+        self._count = count
+        self._interval = interval
+        offset = COMPACT_HEADER.size
+        view = memoryview(self._mmap)
+        self._values = view[offset : (offset := offset + 4 * count)].cast("f")
+        nrestarts = -(-count // interval)
+        self._restarts = view[offset : (offset := offset + 4 * nrestarts)].cast("I")
+        self._keys = offset
+        if sys.byteorder == "big":
+            # views are in native byte order, copy & swap the little endian arrays
+            for name, typecode in (("_values", "f"), ("_restarts", "I")):
+                column = array(typecode, view := getattr(self, name))
+                column.byteswap()
+                view.release()
+                setattr(self, name, column)
+
+    def close(self) -> None:
+        for name in ("_values", "_restarts"):
+            if isinstance(view := getattr(self, name, None), memoryview):
+                view.release()
+        self._mmap.close()
+
+    def __enter__(self) -> CompactDurations:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def _decode(self, offset: int, previous: bytes) -> tuple[bytes, int]:
+        shared, offset = decode_varint(self._mmap, self._keys + offset)
+        length, offset = decode_varint(self._mmap, offset)
+        key = previous[:shared] + self._mmap[offset : offset + length]
+        return key, offset + length - self._keys
+
+    def _block(self, restart: int) -> Iterator[tuple[int, bytes]]:
+        # decode the keys of a single block, yields (index, key)
+        offset = self._restarts[restart]
+        key = b""
+        start = restart * self._interval
+        for index in range(start, min(start + self._interval, self._count)):
+            key, offset = self._decode(offset, key)
+            yield index, key
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for restart in range(len(self._restarts)):
+            for _, key in self._block(restart):
+                yield key.decode()
+
+    def __getitem__(self, key: str) -> float:
+        encoded = key.encode()
+
+        # find the last restart point whose (full) key is <= key
+        low, high = 0, len(self._restarts)
+        while low < high:
+            middle = (low + high) // 2
+            if self._decode(self._restarts[middle], b"")[0] <= encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low:
+            for index, candidate in self._block(low - 1):
+                if candidate == encoded:
+                    return self._values[index]
+                elif candidate > encoded:
+                    break
+        raise KeyError(key)
+
+
+def build_stats_table(
+    new_stats: STATS_MAP,
+    old_stats: STATS_MAP,
+    rejected: dict[str, int] | None = None,
+) -> Table:
+    table = Table(box=box.MARKDOWN)
+    table.add_column("OS")
+    table.add_column("Number of tests")
+    table.add_column("Total run time (min)")
+    table.add_column("Average run time (sec)")
+    if rejected is not None:
+        table.add_column("Rejected samples")
+    for os_name in sorted({*new_stats, *old_stats}):
+        ncount, ntotal, naverage = new_stats.get(os_name, DurationStats())
+        ocount, ototal, oaverage = old_stats.get(os_name, DurationStats())
+
+        dcount = ncount - ocount
+        dtotal = ntotal - ototal
+        daverage = naverage - oaverage
+
+        table.add_row(
+            os_name,
+            f"{ncount} ({dcount:+})",
+            f"{ntotal / 60:.2f} ({dtotal / 60:+.2f})",
+            f"{naverage:.2f} ({daverage:+.2f})",
+            *(() if rejected is None else (str(rejected.get(os_name, 0)),)),
+        )
+    return table
+
+
+def print_profile(phases: dict[str, dict[str, float | int | None]]) -> None:
+    # a plain line, a table title is rendered as a (centered) line of its own anyway
+    print("Profile")
+    table = Table(box=box.MARKDOWN)
+    table.add_column("Phase")
+    table.add_column("Wall (sec)")
+    table.add_column("CPU (sec)")
+    table.add_column("Files read")
+    table.add_column("Read (MiB)")
+    table.add_column("Peak RSS (MiB)")
+    for name, phase in phases.items():
+        rss = phase["peak_rss"]
+        table.add_row(
+            name,
+            f"{phase['wall']:.3f}",
+            f"{phase['cpu']:.3f}",
+            str(phase["files"]),
+            f"{phase['bytes'] / 2**20:.2f}",
+            "-" if rss is None else f"{rss / 2**20:.1f}",
+        )
+    print(table)
+
+
+#: per repository options of a batch manifest entry
+BATCH_OPTIONS = {
+    "artifacts-dir": partial(validate_dir, writable=True),
+    "durations-dir": validate_dir,
+    "samples-file": validate_file,
+    "runs-manifest": validate_file,
+    "report-file": validate_file,
+}
+
+
+def read_batch(path: Path) -> list[dict[str, str]]:
+    entries = json.loads(path.read_text())
+    if not isinstance(entries, list) or not all(
+        isinstance(entry, dict) for entry in entries
+    ):
+        raise ValueError(f"{path} must contain a list of objects")
+
+    repositories = set()
+    for entry in entries:
+        if missing := {"repository", "artifacts-dir", "durations-dir"} - entry.keys():
+            raise ValueError(f"{path}: {entry} is missing {', '.join(sorted(missing))}")
+        elif unknown := entry.keys() - {"repository", *BATCH_OPTIONS}:
+            raise ValueError(
+                f"{path}: {entry} has unknown {', '.join(sorted(unknown))}"
+            )
+        elif entry["repository"] in repositories:
+            raise ValueError(f"{path}: {entry['repository']} is listed more than once")
+        repositories.add(entry["repository"])
+    return entries
+
+
+def combine_repository(
+    args: Namespace,
+    entry: dict[str, str],
+) -> tuple[str, dict[str, Any] | None]:
+    # worker: combine a single repository of a batch, returns its (captured) output
+    # and drift report (None if it failed)
+    with CONSOLE.capture() as capture:
+        try:
+            options = {
+                key.replace("-", "_"): validate(entry[key])
+                for key, validate in BATCH_OPTIONS.items()
+                if key in entry
+            }
+            # repositories are combined concurrently, each with a single worker
+            report = combine(Namespace(**{**vars(args), **options, "jobs": 1}))
+            if report_file := options.get("report_file"):
+                write_report(report, report_file)
+        except (ArgumentTypeError, OSError, ValueError) as err:
+            # ArgumentTypeError: invalid path in the manifest
+            # OSError: failed to read/write durations
+            # ValueError: invalid durations (including JSONDecodeError)
+            print(f"❌ Failed to combine durations: {err}", markup=False)
+            report = None
+    return capture.get(), report
+
+
+def combine_batch(args: Namespace) -> int:
+    """Combine the durations of every repository in the batch manifest.
+
+    Repositories are combined in worker processes (amortizing the interpreter startup
+    and imports over the batch), their output is printed in manifest order.
+    """
+    entries = read_batch(args.batch)
+    worker = partial(combine_repository, args)
+
+    reports: dict[str, dict[str, Any]] = {}
+    table = Table(box=box.MARKDOWN)
+    table.add_column("Repository")
+    table.add_column("OSes")
+    table.add_column("Added tests")
+    table.add_column("Removed tests")
+    table.add_column("Total run time (min)")
+
+    errors = 0
+    with (
+        ProcessPoolExecutor(min(args.jobs, len(entries)))
+        if args.jobs > 1 and len(entries) > 1
+        else nullcontext()
+    ) as pool:
+        results = pool.map(worker, entries) if pool else map(worker, entries)
+        for entry, (output, report) in zip(entries, results):
+            repository = entry["repository"]
+            print(f"#### {repository}", markup=False)
+            print(Text.from_ansi(output), end="")
+            if report is None:
+                errors += 1
+                table.add_row(repository, "❌", "-", "-", "-")
+                continue
+
+            reports[repository] = report
+            oses = report["oses"].values()
+            table.add_row(
+                repository,
+                str(len(oses)),
+                f"{sum(os_report['added'] for os_report in oses):+}",
+                f"{-sum(os_report['removed'] for os_report in oses):+}",
+                f"{sum(os_report['delta'] for os_report in oses) / 60:+.2f}",
+            )
+
+    print("#### Batch")
+    print(table)
+    if errors:
+        print(f"❌ Failed to combine {errors} of {len(entries)} repositories")
+    dump_report({"repositories": reports})
+    return errors
 
 
 def get_step_summary(html: str) -> str:
@@ -178,45 +2000,165 @@ def dump_summary(console: Console = CONSOLE) -> None:
             fh.write(get_output(html))
 
 
-def main() -> None:
-    args = parse_args()
+def combine(args: Namespace) -> dict[str, Any]:
+    """Combine the durations of a single repository, returns the drift report."""
+    streaming = args.aggregation == "streaming"
+    PROFILER.enabled = args.profile
+    PROFILER.phases = {}
+
+    if args.runs_manifest and not args.samples_file:
+        print(
+            "⚠️ --runs-manifest without --samples-file: the previous durations count "
+            "as a single sample, so the history is re-weighted towards the latest runs"
+        )
+
+    with PROFILER.phase("discover"):
+        # runs that have already been ingested by a previous invocation
+        ingested = read_manifest(args.runs_manifest) if args.runs_manifest else set()
+        runs = find_runs(args.artifacts_dir)
+
+    if args.samples_file:
+        # incremental: only ingest new runs and fold them into the sample store
+        with PROFILER.phase("aggregate_new"):
+            store = SampleStore.load(args.samples_file, args.durations_dir)
+            combined, new_stats = aggregate_new_durations(
+                args.artifacts_dir, True, exclude=ingested | store.runs
+            )
+            store.update(combined, runs, args.max_samples)
+            combined = store.durations
+        with PROFILER.phase("aggregate_old"):
+            old_stats = aggregate_stored_durations(args.durations_dir, store)
+
+            # compare against what will be written, not just the newly ingested runs
+            new_stats = {
+                os_name: DurationStats(tests=dict(tests))
+                for os_name, tests in store.durations.items()
+            }
+    elif args.aggregation == "merge":
+        # new & old durations are merged and written in a single streaming pass
+        with PROFILER.phase("merge"):
+            new_stats, old_stats, drift = merge_durations(
+                args.artifacts_dir,
+                args.durations_dir,
+                exclude=ingested,
+                unlink=not args.runs_manifest,
+                top=args.top,
+            )
+        combined = None
+    elif args.aggregation == "columnar":
+        with PROFILER.phase("aggregate"):
+            combined, new_stats, old_stats = aggregate_columnar_durations(
+                args.artifacts_dir,
+                args.durations_dir,
+                exclude=ingested,
+                unlink=not args.runs_manifest,
+            )
+    else:
+        with PROFILER.phase("aggregate_new"):
+            combined, new_stats = aggregate_new_durations(
+                args.artifacts_dir, streaming, exclude=ingested
+            )
+        with PROFILER.phase("aggregate_old"):
+            combined, old_stats = aggregate_old_durations(
+                args.durations_dir,
+                combined,
+                # when skipping ingested runs an OS without new runs is not stale
+                unlink=not args.runs_manifest,
+            )
 
-    combined, new_stats = aggregate_new_durations(args.artifacts_dir)
-    combined, old_stats = aggregate_old_durations(args.durations_dir, combined)
+    # drop outlying samples (e.g., from a slow runner) before estimating
+    rejected = None
+    if args.outliers != "none":
+        with PROFILER.phase("outliers"):
+            rejected = {}
+            for os_name, os_combined in combined.items():
+                combined[os_name], rejected[os_name] = reject_outliers(
+                    os_combined, args.outliers, args.outlier_threshold
+                )
+
+    if args.runs_manifest:
+        # OSes without new runs are kept as is, not listed as removed
+        for os_name in old_stats.keys() - new_stats.keys():
+            del old_stats[os_name]
 
     # display stats
-    table = Table(box=box.MARKDOWN)
-    table.add_column("OS")
-    table.add_column("Number of tests")
-    table.add_column("Total run time (min)")
-    table.add_column("Average run time (sec)")
-    for os_name in sorted({*new_stats, *old_stats}):
-        ncount, ntotal, naverage = new_stats.get(os_name, DurationStats())
-        ocount, ototal, oaverage = old_stats.get(os_name, DurationStats())
+    with PROFILER.phase("stats"):
+        print(build_stats_table(new_stats, old_stats, rejected))
 
-        dcount = ncount - ocount
-        dtotal = ntotal - ototal
-        daverage = naverage - oaverage
+    # write out estimates
+    with PROFILER.phase("estimate"):
+        if combined is None:
+            # already written, only loaded when needed for the compact files or shards
+            estimates = {
+                os_name: dict(iter_durations(args.durations_dir / f"{os_name}.json"))
+                for os_name in new_stats
+                if args.compact or args.shards > 0
+            }
+        else:
+            estimates = {
+                os_name: estimate_durations(
+                    os_combined,
+                    args.estimator,
+                    half_life=args.half_life,
+                    trim=args.trim,
+                )
+                for os_name, os_combined in combined.items()
+            }
+    with PROFILER.phase("write"):
+        for os_name, os_estimates in estimates.items():
+            if combined is not None:
+                (args.durations_dir / f"{os_name}.json").write_text(
+                    dump_durations(os_estimates)
+                )
+            if args.compact:
+                write_compact(args.durations_dir / f"{os_name}.cdur", os_estimates)
+        if args.samples_file:
+            store.dump(args.samples_file)
+        if args.runs_manifest:
+            # only reached once every artifact was ingested & the durations written,
+            # runs must be complete when downloaded (the action only lists completed
+            # runs and discards partial downloads) as they are never downloaded again
+            write_manifest(args.runs_manifest, ingested | runs)
 
-        table.add_row(
-            os_name,
-            f"{ncount} ({dcount:+})",
-            f"{ntotal / 60:.2f} ({dtotal / 60:+.2f})",
-            f"{naverage:.2f} ({daverage:+.2f})",
-        )
-    print(table)
+    # precompute balanced shard assignments
+    if args.shards > 0:
+        with PROFILER.phase("shards"):
+            shards = {
+                os_name: partition_durations(os_estimates, args.shards)
+                for os_name, os_estimates in estimates.items()
+            }
+            for os_name, (groups, makespans) in shards.items():
+                write_shards(args.durations_dir, os_name, groups, makespans)
+            print_shards(shards)
 
-    # write out averages
-    for os_name, os_combined in combined.items():
-        (args.durations_dir / f"{os_name}.json").write_text(
-            json.dumps(
-                {key: fmean(values) for key, values in os_combined.items()},
-                indent=4,
-                sort_keys=True,
+    # report per-test drift between the previous and the new durations
+    with PROFILER.phase("drift"):
+        if combined is None:
+            report = drift.report()
+        else:
+            report = compute_drift(
+                {os_name: stats.durations() for os_name, stats in old_stats.items()},
+                estimates,
+                args.top,
             )
-            + "\n"  # include trailing newline
-        )
+        print_drift(report)
+
+    if args.profile:
+        print_profile(PROFILER.phases)
+    if args.profile_file:
+        args.profile_file.write_text(json.dumps(PROFILER.phases, indent=2) + "\n")
+
+    return report
+
+
+def main() -> None:
+    args = parse_args()
+    if args.batch:
+        errors = combine_batch(args)
+        dump_summary()
+        sys.exit(int(bool(errors)))
 
+    dump_report(combine(args), args.report_file)
     dump_summary()
     sys.exit(0)
 
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+import pytest
+from benchmark_durations import PHASES, generate_artifacts, main
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_generate_artifacts(tmp_path: Path) -> None:
+    artifacts_dir, durations_dir = generate_artifacts(tmp_path, 2, 3, 50)
+    assert len(list(artifacts_dir.glob("*/*/*.json"))) == 2 * 3
+    assert sorted(path.name for path in durations_dir.glob("*.json")) == [
+        "OS0.json",
+        "OS1.json",
+    ]
+    durations = json.loads((durations_dir / "OS0.json").read_text())
+    assert all("::test_" in test_id for test_id in durations)
+
+
+@pytest.mark.parametrize("aggregation", ["samples", "streaming"])
+def test_benchmark(tmp_path: Path, aggregation: str) -> None:
+    output = tmp_path / "results.json"
+    results = main(
+        [
+            "--oses=2",
+            "--runs=2",
+            "--tests=20",
+            f"--aggregation={aggregation}",
+            f"--output={output}",
+        ]
+    )
+    assert json.loads(output.read_text()) == results
+    assert tuple(results["phases"]) == PHASES
+    assert results["phases"]["import"]["seconds"] > 0
+    for name in PHASES[1:]:
+        assert results["phases"][name]["seconds"] >= 0
+        assert results["phases"][name]["peak_bytes"] > 0
+
+    # compare against the previous results without tracing memory
+    results = main(["--tests=20", "--no-memory", f"--compare={output}"])
+    assert all("peak_bytes" not in phase for phase in results["phases"].values())
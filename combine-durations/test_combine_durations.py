@@ -1,27 +1,106 @@
 from __future__ import annotations
 
 import json
+import random
+import re
+import shutil
+import struct
+import subprocess
+import sys
+import tracemalloc
 from argparse import ArgumentTypeError
+from io import StringIO
+from math import inf, isnan, nan
 from pathlib import Path
+from statistics import fmean, variance
 from typing import TYPE_CHECKING
 
+import numpy as np
 import pytest
+from rich import box
+from rich.console import Console
+from rich.table import Table
 
+import combine_durations
 from combine_durations import (
+    COMPACT_HEADER,
+    TRUNCATED_NOTICE,
+    ColumnarDurations,
+    CompactDurations,
     DurationStats,
+    Profiler,
+    RunningDuration,
+    SampleStore,
+    SummaryConsole,
+    aggregate_columnar_durations,
     aggregate_new_durations,
     aggregate_old_durations,
+    aggregate_stored_durations,
+    average,
+    build_stats_table,
+    combine,
+    combine_batch,
+    compute_drift,
+    dump_durations,
+    dump_report,
+    dump_summary,
+    estimate_durations,
+    estimate_memory,
+    ewma,
+    find_runs,
+    get_run_id,
+    iqr_inliers,
+    iter_durations,
+    json_loads,
+    mad_inliers,
+    median,
+    merge_durations,
+    p90,
+    parse_args,
+    partition_durations,
+    print_drift,
+    print_removed,
+    read_artifacts,
+    read_batch,
     read_durations,
+    read_manifest,
+    recent_runs,
+    reject_outliers,
+    trimmed_mean,
     validate_dir,
+    validate_file,
+    validate_jobs,
+    write_compact,
+    write_durations,
+    write_manifest,
+    write_shards,
 )
 
 if TYPE_CHECKING:
+    from pytest import MonkeyPatch
+
     from combine_durations import COMBINED_TYPE, STATS_MAP
 
 DURATIONS_DIR = Path(__file__).parent / "data" / "durations"
 ARTIFACTS_DIR = Path(__file__).parent / "data" / "artifacts"
 
 
+def parse_markdown_tables(text: str) -> list[list[list[str]]]:
+    # every markdown table in the output as rows of cells, each table must be
+    # well-formed: a single header row, the separator, and rows of equal length
+    tables: list[list[list[str]]] = []
+    rows: list[list[str]] = []
+    for line in [*re.sub(r"\x1b\[[0-9;]*m", "", text).splitlines(), ""]:
+        if line.startswith("|"):
+            rows.append([cell.strip() for cell in line.strip()[1:-1].split("|")])
+        elif rows:
+            assert all(set(cell) == {"-"} for cell in rows[1])
+            assert len({len(row) for row in rows}) == 1
+            tables.append([rows[0], *rows[2:]])
+            rows = []
+    return tables
+
+
 def test_validate_dir(tmp_path: Path) -> None:
     # directory
     assert validate_dir(tmp_path, writable=False) == tmp_path
@@ -54,6 +133,32 @@ def test_validate_dir(tmp_path: Path) -> None:
     # TODO: not easy to test using either chmod or chown
 
 
+def test_validate_file(tmp_path: Path) -> None:
+    # missing
+    assert validate_file(path := tmp_path / "missing.json") == path
+    assert validate_file(path := tmp_path / "nested" / "missing.json") == path
+    assert path.parent.is_dir()
+
+    # directory
+    with pytest.raises(ArgumentTypeError, match=r"not a valid file"):
+        validate_file(tmp_path)
+
+    # parent is a file
+    (path := tmp_path / "file").touch()
+    with pytest.raises(ArgumentTypeError, match=r"not a valid file"):
+        validate_file(path / "samples.json")
+
+
+def test_validate_jobs() -> None:
+    assert validate_jobs("1") == 1
+    assert validate_jobs("4") == 4
+    assert validate_jobs("0") >= 1
+    with pytest.raises(ArgumentTypeError, match=r"not a valid number of jobs"):
+        validate_jobs("-1")
+    with pytest.raises(ArgumentTypeError, match=r"not a valid number of jobs"):
+        validate_jobs("many")
+
+
 @pytest.mark.parametrize(
     "path",
     [pytest.param(path, id=path.name) for path in DURATIONS_DIR.glob("*.json")],
@@ -70,6 +175,80 @@ def test_read_durations(path: Path) -> None:
     assert stats[os].average_run_time == sum(data.values()) / len(data)
 
 
+@pytest.mark.parametrize(
+    "path",
+    [
+        pytest.param(path, id=str(path.relative_to(path.parents[1])))
+        for path in sorted(
+            [*DURATIONS_DIR.glob("*.json"), *ARTIFACTS_DIR.glob("**/*.json")]
+        )
+    ],
+)
+def test_json_loads(path: Path) -> None:
+    assert json_loads(path.read_bytes()) == json.loads(path.read_text())
+
+
+def test_json_loads_non_finite(tmp_path: Path) -> None:
+    # the fast backends reject NaN/Infinity, which the durations may contain
+    pytest.importorskip("orjson")
+    assert combine_durations.fast_loads is not None
+
+    data = {"test_a": nan, "test_b": inf, "test_c": 1.5}
+    path = tmp_path / "linux-64.json"
+    path.write_text(dump_durations(data))
+    _, loaded = read_durations(path, {})
+    assert isnan(loaded.pop("test_a"))
+    assert loaded == {"test_b": inf, "test_c": 1.5}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        pytest.param({}, id="empty"),
+        pytest.param({"tests/test_a.py::test_a": 1}, id="int"),
+        pytest.param(
+            {
+                "tests/test_b.py::test_b[\u00e9]": 1e16,
+                'tests/test_a.py::test_a["quoted"]': 1e-7,
+                "tests/test_c.py::test_c[\N{SNAKE}]": 0.1 + 0.2,
+            },
+            id="escapes",
+        ),
+        pytest.param({"tests/test_a.py::test_a": float("nan")}, id="nan"),
+        pytest.param(
+            {f"tests/test_{i % 7}.py::test[{i}]": i / 3 for i in range(1_000)},
+            id="many",
+        ),
+    ],
+)
+def test_dump_durations(data: dict[str, float]) -> None:
+    assert dump_durations(data) == json.dumps(data, indent=4, sort_keys=True) + "\n"
+
+
+def test_duration_stats() -> None:
+    stats = DurationStats()
+    stats.add({"test_a": 1.0, "test_b": 2.0})
+    # duplicate durations are not dropped
+    stats.add({"test_a": 1.0, "test_b": 5.0})
+    stats.add({"test_a": 4.0})
+    assert stats.number_of_tests == 2
+    assert stats.tests["test_a"].count == 3
+    assert stats.total_run_time == pytest.approx(2.0 + 3.5)
+    assert stats.average_run_time == pytest.approx(5.5 / 2)
+
+    # running total matches a recomputation
+    other = DurationStats()
+    other.add({"test_b": 0.5, "test_c": 3.0})
+    stats.merge(other)
+    assert stats.total_run_time == pytest.approx(
+        sum(duration.mean for duration in stats.tests.values())
+    )
+    assert DurationStats(tests=stats.tests).total_run_time == pytest.approx(
+        stats.total_run_time
+    )
+    assert stats == DurationStats(tests=stats.tests)
+
+
 def test_duration_stats_empty() -> None:
     stats = DurationStats()
     assert stats.number_of_tests == 0
@@ -78,6 +257,82 @@ def test_duration_stats_empty() -> None:
     assert list(stats) == [0, 0.0, 0.0]
 
 
+def test_running_duration() -> None:
+    duration = RunningDuration()
+    assert duration.count == 0
+    assert duration.mean == 0.0
+    assert duration.variance == 0.0
+
+    rng = random.Random(42)
+    for _ in range(1_000):
+        values = [rng.expovariate(1 / rng.choice((1e-3, 1, 100))) for _ in range(10)]
+        duration = RunningDuration()
+        for value in values:
+            duration.append(value)
+        assert duration.count == len(values)
+        # compensated total must reproduce fmean exactly
+        assert duration.mean == fmean(values)
+        assert duration.variance == pytest.approx(variance(values))
+
+
+def test_running_duration_extend() -> None:
+    rng = random.Random(42)
+    values = [rng.expovariate(1) for _ in range(25)]
+    for split in (0, 1, 10, 25):
+        left, right = RunningDuration(), RunningDuration()
+        for value in values[:split]:
+            left.append(value)
+        for value in values[split:]:
+            right.append(value)
+        left.extend(right)
+        assert left.count == len(values)
+        assert left.mean == fmean(values)
+        assert left.variance == pytest.approx(variance(values))
+
+
+def test_estimate_memory(tmp_path: Path) -> None:
+    assert estimate_memory(0) == estimate_memory(0, 10) == 0
+    assert estimate_memory(2_000) == 2 * estimate_memory(1_000) > 0
+    assert estimate_memory(1_000, 10) > estimate_memory(1_000)
+
+    # compare against what streaming aggregation actually retains
+    count = 20_000
+    data = {f"tests/test_{i % 100}.py::test_{i:05}": i / 1_000 for i in range(count)}
+    (artifacts_dir := tmp_path / "artifacts" / "1").mkdir(parents=True)
+    (artifacts_dir / "linux-64.json").write_text(json.dumps(data))
+    (durations_dir := tmp_path / "durations").mkdir()
+    (durations_dir / "linux-64.json").write_text(json.dumps(data))
+
+    tracemalloc.start()
+    try:
+        combined, new_stats = aggregate_new_durations(artifacts_dir.parent, True)
+        combined, old_stats = aggregate_old_durations(durations_dir, combined)
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    name_length = len(next(iter(data)))
+    assert estimate_memory(count, name_length) == pytest.approx(retained, rel=0.2)
+
+
+def test_aggregate_streaming() -> None:
+    combined, new_stats = aggregate_new_durations(ARTIFACTS_DIR)
+    combined, old_stats = aggregate_old_durations(DURATIONS_DIR, combined, unlink=False)
+    streamed, snew_stats = aggregate_new_durations(ARTIFACTS_DIR, streaming=True)
+    streamed, sold_stats = aggregate_old_durations(
+        DURATIONS_DIR, streamed, unlink=False
+    )
+
+    assert combined.keys() == streamed.keys()
+    for os in combined:
+        assert combined[os].keys() == streamed[os].keys()
+        for test, values in combined[os].items():
+            assert streamed[os][test].count == len(values)
+            assert average(streamed[os][test]) == average(values) == fmean(values)
+    for os in new_stats:
+        assert list(snew_stats[os]) == pytest.approx(list(new_stats[os]))
+        assert list(sold_stats[os]) == pytest.approx(list(old_stats[os]))
+
+
 def test_stats_table_with_missing_new_durations(tmp_path: Path) -> None:
     """No downloaded artifacts, but existing duration files (conda-build failure)."""
     durations_dir = tmp_path / "durations"
@@ -116,6 +371,21 @@ def test_aggregate_new_durations() -> None:
         assert stats[os].average_run_time > 0
 
 
+def test_read_artifacts(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    paths = []
+    for i in range(20):
+        (path := tmp_path / str(i) / f"OS{i % 3}.json").parent.mkdir()
+        path.write_text(str(i))
+        paths.append(path)
+
+    # artifacts are yielded in order
+    monkeypatch.setattr("combine_durations.PROFILER", profiler := Profiler())
+    assert list(read_artifacts(paths)) == [
+        (f"OS{i % 3}", str(i).encode()) for i in range(20)
+    ]
+    assert profiler.files == 20
+
+
 @pytest.mark.parametrize(
     "combined,num_combined",
     [
@@ -145,3 +415,1015 @@ def test_aggregate_old_durations(combined: COMBINED_TYPE, num_combined: int) ->
     for os in ("OS1", "OS2"):
         assert len(combined.get(os, ())) == num_combined
         assert old_stats[os].number_of_tests == 6
+
+
+def test_get_run_id() -> None:
+    assert get_run_id(ARTIFACTS_DIR, ARTIFACTS_DIR / "OS1_run1" / "OS1.json") == (
+        "OS1_run1"
+    )
+    assert get_run_id(ARTIFACTS_DIR, ARTIFACTS_DIR / "1" / "all" / "OS1.json") == "1"
+    assert get_run_id(ARTIFACTS_DIR, ARTIFACTS_DIR / "OS1.json") is None
+
+
+def test_find_runs() -> None:
+    assert find_runs(ARTIFACTS_DIR) == {"OS1_run1", "OS1_run2", "OS2_run1", "OS2_run2"}
+
+
+def test_recent_runs() -> None:
+    assert recent_runs(["10", "9", "100", "11"]) == ["9", "10", "11", "100"]
+    assert recent_runs(["10", "9", "100", "11"], 2) == ["11", "100"]
+    assert recent_runs([], 2) == []
+
+
+def test_manifest(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    assert read_manifest(path := tmp_path / "runs.txt") == set()
+
+    write_manifest(path, {"2", "1"})
+    assert path.read_text() == "1\n2\n"
+    assert read_manifest(path) == {"1", "2"}
+
+    monkeypatch.setattr("combine_durations.RUNS_LIMIT", 2)
+    write_manifest(path, {"3", *read_manifest(path)})
+    assert read_manifest(path) == {"2", "3"}
+
+
+def test_aggregate_new_durations_exclude() -> None:
+    combined, stats = aggregate_new_durations(
+        ARTIFACTS_DIR, exclude={"OS1_run1", "OS1_run2"}
+    )
+    assert set(combined) == set(stats) == {"OS2"}
+
+
+def test_sample_store(tmp_path: Path) -> None:
+    store = SampleStore.load(path := tmp_path / "samples.json")
+    assert not store.runs
+    assert not store.durations
+
+    # first update ingests everything
+    combined, _ = aggregate_new_durations(ARTIFACTS_DIR, streaming=True)
+    store.update(combined, ["2", "1"])
+    assert store.runs == {"1", "2"}
+    for os in ("OS1", "OS2"):
+        assert store.durations[os].keys() == combined[os].keys()
+
+    # round trip
+    store.dump(path)
+    loaded = SampleStore.load(path)
+    assert loaded.runs == store.runs
+    for os, tests in store.durations.items():
+        for test, duration in tests.items():
+            assert loaded.durations[os][test].count == duration.count
+            assert loaded.durations[os][test].mean == duration.mean
+
+    assert loaded.seen == store.seen
+    assert {run for tests in loaded.seen.values() for run in tests.values()} == {"2"}
+
+    # samples are capped (decayed) to `max_samples`
+    duration = RunningDuration()
+    for _ in range(5):
+        duration.append(2.0)
+    loaded.update({"OS1": {"tests/test_alpha.py::test_a": duration}}, ["3"], 4)
+    assert loaded.durations["OS1"]["tests/test_alpha.py::test_a"].count == 4
+    assert loaded.durations["OS1"]["tests/test_alpha.py::test_a"].mean > 1.1
+    assert loaded.durations["OS2"] == store.durations["OS2"]
+    assert loaded.seen["OS1"]["tests/test_alpha.py::test_a"] == "3"
+
+    # missing tests are kept until absent from the last `max_samples` runs
+    assert loaded.durations["OS1"].keys() == store.durations["OS1"].keys()
+    for run in ("4", "5"):
+        loaded.update({"OS1": {"tests/test_alpha.py::test_a": duration}}, [run], 4)
+        assert loaded.durations["OS1"].keys() == store.durations["OS1"].keys()
+    loaded.update({"OS1": {"tests/test_alpha.py::test_a": duration}}, ["6"], 4)
+    assert set(loaded.durations["OS1"]) == {"tests/test_alpha.py::test_a"}
+    assert set(loaded.seen["OS1"]) == {"tests/test_alpha.py::test_a"}
+    # only OSes with new durations are pruned
+    assert loaded.durations["OS2"] == store.durations["OS2"]
+
+
+def test_sample_store_seed(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    shutil.copytree(ARTIFACTS_DIR, artifacts_dir := tmp_path / "artifacts")
+    shutil.copytree(DURATIONS_DIR, durations_dir := tmp_path / "durations")
+    samples_file = tmp_path / "samples.json"
+    argv = [
+        f"--artifacts-dir={artifacts_dir}",
+        f"--durations-dir={durations_dir}",
+        f"--samples-file={samples_file}",
+    ]
+    combine(parse_args(argv))
+
+    # the previous durations are the first sample instead of being dropped
+    out = capsys.readouterr().out
+    assert "Seeding the sample store from the previous durations (OS1, OS2)" in out
+    store = SampleStore.load(samples_file)
+    assert store.durations["OS1"]["tests/test_alpha.py::test_a"].count == 2
+    assert store.durations["OS1"]["tests/test_alpha.py::test_a"].mean == 1.05
+    assert store.durations["OS1"]["tests/test_alpha.py::test_c"].count == 1
+    # tests missing from the new runs are removed (with a warning)
+    assert out.count("tests not present in new durations, removing") == 2
+    assert "OS1::tests/test_gamma.py::test_a" in out
+    assert "tests/test_gamma.py::test_a" not in store.durations["OS1"]
+    assert json.loads((durations_dir / "OS1.json").read_text())[
+        "tests/test_alpha.py::test_a"
+    ] == pytest.approx(1.05)
+
+    # not seeded again
+    combine(parse_args(argv))
+    assert "Seeding" not in capsys.readouterr().out
+
+
+def test_sample_store_legacy(tmp_path: Path) -> None:
+    # stores without the last run count as seen in the latest run
+    (path := tmp_path / "samples.json").write_text(
+        json.dumps({"runs": ["9", "10"], "durations": {"OS1": {"test_a": [2, 3.0]}}})
+    )
+    store = SampleStore.load(path)
+    assert store.durations["OS1"]["test_a"].mean == 1.5
+    assert store.seen == {"OS1": {"test_a": "10"}}
+
+
+def test_sample_store_runs_limit(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setattr("combine_durations.RUNS_LIMIT", 2)
+    SampleStore(runs={"9", "10", "11"}).dump(path := tmp_path / "samples.json")
+    assert SampleStore.load(path).runs == {"10", "11"}
+
+
+def test_aggregate_stored_durations(tmp_path: Path) -> None:
+    for path in DURATIONS_DIR.glob("*.json"):
+        (tmp_path / path.name).write_text(path.read_text())
+
+    store = SampleStore(durations={"OS1": {}})
+    old_stats = aggregate_stored_durations(tmp_path, store, unlink=False)
+    assert set(old_stats) == {"OS1", "OS2"}
+    assert (tmp_path / "OS2.json").exists()
+
+    old_stats = aggregate_stored_durations(tmp_path, store)
+    assert set(old_stats) == {"OS1", "OS2"}
+    assert not (tmp_path / "OS2.json").exists()
+
+
+def test_aggregate_chronological_order() -> None:
+    combined, _ = aggregate_new_durations(ARTIFACTS_DIR)
+    combined, _ = aggregate_old_durations(DURATIONS_DIR, combined, unlink=False)
+    # old durations first, then runs from oldest to newest
+    assert combined["OS1"]["tests/test_alpha.py::test_a"] == [1, 1.1]
+    assert combined["OS2"]["tests/test_alpha.py::test_a"] == [2, 2.1]
+
+
+def test_ewma() -> None:
+    samples = np.array([[1.0, 1.0, 1.0], [1.0, 2.0, 4.0]])
+    estimates = ewma(samples, half_life=1.0)
+    assert estimates[0] == pytest.approx(1.0)
+    # weights 1/4, 1/2, 1 (oldest to newest)
+    assert estimates[1] == pytest.approx((0.25 + 1 + 4) / 1.75)
+    # a long half-life approaches the mean
+    assert ewma(samples, half_life=1e9)[1] == pytest.approx(7 / 3)
+
+
+def test_trimmed_mean() -> None:
+    samples = np.array([[1.0, 2.0, 3.0, 4.0, 100.0]])
+    assert trimmed_mean(samples, trim=0.2)[0] == pytest.approx(3.0)
+    assert trimmed_mean(samples, trim=0.0)[0] == pytest.approx(22.0)
+    # never trims everything
+    assert trimmed_mean(samples, trim=0.5)[0] == pytest.approx(3.0)
+    assert trimmed_mean(np.array([[1.0, 3.0]]), trim=0.5)[0] == pytest.approx(2.0)
+
+
+def test_median_p90() -> None:
+    samples = np.array([[float(i) for i in range(1, 12)]])
+    assert median(samples)[0] == 6.0
+    assert p90(samples)[0] == pytest.approx(10.0)
+
+
+@pytest.mark.parametrize("estimator", ["mean", "ewma", "trimmed", "median", "p90"])
+def test_estimate_durations(estimator: str) -> None:
+    os_combined = {
+        "test_a": [1.0],
+        "test_b": [1.0, 2.0, 3.0],
+        "test_c": [2.0, 2.0],
+        "test_d": [0.1, 0.2, 0.3],
+    }
+    estimates = estimate_durations(os_combined, estimator)
+    assert estimates.keys() == os_combined.keys()
+    assert all(isinstance(value, float) for value in estimates.values())
+    assert estimates["test_a"] == 1.0
+    assert estimates["test_c"] == 2.0
+    assert (
+        min(os_combined["test_b"]) <= estimates["test_b"] <= max(os_combined["test_b"])
+    )
+    if estimator == "mean":
+        # default is exactly fmean
+        assert estimates["test_d"] == fmean(os_combined["test_d"])
+
+
+def test_columnar_durations() -> None:
+    columns = ColumnarDurations()
+    assert list(columns) == [0, 0.0, 0.0]
+    assert columns.estimate() == {}
+
+    columns.add({"test_a": 1.0, "test_b": 2.0})
+    columns.add({"test_b": 4.0, "test_c": 3.0})
+    columns.add({"test_a": 0.5, "test_b": 0.5}, oldest=True)
+    assert columns.keys() == ["test_a", "test_b", "test_c"]
+    assert "test_a" in columns
+    assert "test_d" not in columns
+    assert columns.number_of_tests == 3
+    assert columns.total_run_time == pytest.approx(0.75 + 6.5 / 3 + 3.0)
+    assert columns.estimate() == pytest.approx(
+        {"test_a": 0.75, "test_b": 6.5 / 3, "test_c": 3.0}
+    )
+
+    # previous durations are the oldest sample
+    grouped = {tuple(tests): samples.tolist() for tests, samples in columns.grouped()}
+    assert grouped == {(0,): [[0.5, 1.0]], (1,): [[0.5, 2.0, 4.0]], (2,): [[3.0]]}
+
+    # copies are independent
+    copy = columns.copy()
+    copy.add({"test_d": 1.0})
+    assert columns.number_of_tests == 3
+    assert copy.number_of_tests == 4
+
+    # extend remaps the interned test IDs
+    other = ColumnarDurations()
+    other.add({"test_c": 5.0, "test_e": 1.0})
+    columns.extend(other)
+    assert columns.keys() == ["test_a", "test_b", "test_c", "test_e"]
+    assert columns.estimate()["test_c"] == pytest.approx(4.0)
+
+
+@pytest.mark.parametrize("estimator", ["mean", "ewma", "trimmed", "median", "p90"])
+def test_aggregate_columnar_durations(estimator: str) -> None:
+    combined, new_stats = aggregate_new_durations(ARTIFACTS_DIR)
+    combined, old_stats = aggregate_old_durations(DURATIONS_DIR, combined, unlink=False)
+    columnar, cnew_stats, cold_stats = aggregate_columnar_durations(
+        ARTIFACTS_DIR, DURATIONS_DIR, unlink=False
+    )
+
+    assert combined.keys() == columnar.keys()
+    for os in combined:
+        assert estimate_durations(columnar[os], estimator) == pytest.approx(
+            estimate_durations(combined[os], estimator)
+        )
+        assert list(cnew_stats[os]) == pytest.approx(list(new_stats[os]))
+        assert list(cold_stats[os]) == pytest.approx(list(old_stats[os]))
+
+
+def test_compute_drift() -> None:
+    rng = random.Random(42)
+    old = {os: {f"test_{i}": rng.random() for i in range(200)} for os in ("OS1", "OS2")}
+    new = {
+        os: {test: value + rng.uniform(-1, 1) for test, value in tests.items()}
+        for os, tests in old.items()
+    }
+    del new["OS1"]["test_0"]
+    new["OS1"]["test_new"] = 1.0
+    old["OS3"] = {"test_0": 1.0}
+
+    report = compute_drift(old, new, top=5)
+    assert report["oses"]["OS1"]["added"] == 1
+    assert report["oses"]["OS1"]["removed"] == 1
+    assert report["oses"]["OS2"]["added"] == report["oses"]["OS2"]["removed"] == 0
+    assert "OS3" not in report["oses"]
+
+    # bounded heaps match a full sort
+    deltas = sorted(
+        (new[os][test] - old[os][test], os, test)
+        for os in ("OS1", "OS2")
+        for test in old[os].keys() & new[os].keys()
+    )
+    assert [(entry["os"], entry["test"]) for entry in report["slowdowns"]] == [
+        (os, test) for _, os, test in deltas[::-1][:5]
+    ]
+    assert [(entry["os"], entry["test"]) for entry in report["speedups"]] == [
+        (os, test) for _, os, test in deltas[:5]
+    ]
+    assert all(entry["delta"] > 0 for entry in report["slowdowns"])
+    assert all(entry["delta"] < 0 for entry in report["speedups"])
+    assert report["oses"]["OS2"]["delta"] == pytest.approx(
+        sum(delta for delta, os, _ in deltas if os == "OS2")
+    )
+
+    # nothing to report
+    report = compute_drift(old, old, top=5)
+    assert not report["slowdowns"]
+    assert not report["speedups"]
+    assert not compute_drift(old, new, top=0)["slowdowns"]
+
+
+def test_print_drift(capsys: pytest.CaptureFixture) -> None:
+    # a realistic pytest node ID, longer than the default 80 columns of a non-TTY
+    test = (
+        "tests/package_40/test_module_123.py::TestClass3"
+        "::test_install_case_12345[param-7]"
+    )
+    report = compute_drift({"OS1": {test: 1.0}}, {"OS1": {test: 2.5}})
+    print_drift(report)
+
+    out = capsys.readouterr().out
+    assert "slowdowns" in out
+    assert parse_markdown_tables(out) == [
+        [
+            ["OS", "Test", "Old (sec)", "New (sec)", "Delta (sec)"],
+            ["OS1", f"`{test}`", "1.00", "2.50", "+1.50"],
+        ]
+    ]
+
+
+def test_dump_report(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    report = compute_drift({"OS1": {"test_a": 1.0}}, {"OS1": {"test_a": 2.0}})
+    (output := tmp_path / "output").write_text(old := "text to append\n")
+    monkeypatch.setenv("GITHUB_OUTPUT", str(output))
+
+    dump_report(report, path := tmp_path / "report.json")
+    assert json.loads(path.read_text()) == report
+    key, value = output.read_text().removeprefix(old).rstrip("\n").split("=", 1)
+    assert key == "report"
+    assert json.loads(value) == report
+
+
+def test_partition_durations() -> None:
+    durations = {"a": 7.0, "b": 5.0, "c": 4.0, "d": 3.0, "e": 3.0, "f": 2.0}
+    groups, makespans = partition_durations(durations, 3)
+    assert sorted(test for group in groups for test in group) == sorted(durations)
+    assert makespans == [sum(durations[test] for test in group) for group in groups]
+    # LPT: a, f | b, e | c, d (ties go to the first shard)
+    assert groups == [["a", "f"], ["b", "e"], ["c", "d"]]
+    assert makespans == [9.0, 8.0, 7.0]
+
+    # more shards than tests
+    groups, makespans = partition_durations({"a": 1.0}, 3)
+    assert groups == [["a"], [], []]
+    assert makespans == [1.0, 0.0, 0.0]
+
+
+def test_partition_durations_balance() -> None:
+    rng = random.Random(42)
+    durations = {f"test_{i}": rng.expovariate(1) for i in range(1_000)}
+    groups, makespans = partition_durations(durations, 4)
+    assert sum(map(len, groups)) == len(durations)
+    assert sum(makespans) == pytest.approx(sum(durations.values()))
+    # LPT is within 4/3 of optimal, the average load is a lower bound for optimal
+    assert max(makespans) <= 4 / 3 * sum(makespans) / 4 + max(durations.values())
+
+
+def test_write_shards(tmp_path: Path) -> None:
+    write_shards(tmp_path, "OS1", [["a"], ["b", "c"]], [2.0, 2.5])
+    assert json.loads((tmp_path / "shards" / "OS1.json").read_text()) == {
+        "groups": [["a"], ["b", "c"]],
+        "makespans": [2.0, 2.5],
+        "shards": 2,
+    }
+    # not picked up as a duration file
+    assert not list(tmp_path.glob("*.json"))
+
+
+@pytest.mark.parametrize("count", [0, 1, 16, 17, 100])
+def test_compact_durations(tmp_path: Path, count: int) -> None:
+    durations = {f"tests/test_{i % 7}.py::test_é_{i}": i / 3 for i in range(count)}
+    path = tmp_path / "OS1.cdur"
+    write_compact(path, durations)
+
+    with CompactDurations(path) as compact:
+        assert len(compact) == count
+        assert list(compact) == sorted(durations)
+        for key, value in durations.items():
+            assert compact[key] == pytest.approx(value, rel=1e-6)
+        assert "missing" not in compact
+        assert "" not in compact
+        assert "tests/test_0.py::test_é_" not in compact
+        assert compact.get("tests/zzz", 1.0) == 1.0
+        with pytest.raises(KeyError):
+            compact["missing"]
+
+    # not picked up as a duration file
+    assert not list(tmp_path.glob("*.json"))
+
+
+def test_compact_durations_byteorder(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    # the file is little endian regardless of the host
+    durations = {f"test_{i}": i + 0.5 for i in range(20)}
+    write_compact(path := tmp_path / "OS1.cdur", durations, interval=4)
+    data = path.read_bytes()
+    values = struct.unpack_from("<20f", data, COMPACT_HEADER.size)
+    assert dict(zip(sorted(durations), values)) == durations
+    restarts = struct.unpack_from("<5I", data, COMPACT_HEADER.size + 4 * 20)
+    assert restarts[0] == 0
+    assert list(restarts) == sorted(restarts)
+
+    # arrays are swapped on big endian hosts, both when writing & reading
+    monkeypatch.setattr(
+        sys, "byteorder", "big" if sys.byteorder == "little" else "little"
+    )
+    write_compact(swapped := tmp_path / "OS2.cdur", durations, interval=4)
+    assert swapped.read_bytes() != data
+    with CompactDurations(swapped) as compact:
+        assert dict(compact) == durations
+
+
+def test_compact_durations_invalid(tmp_path: Path) -> None:
+    path = tmp_path / "OS1.cdur"
+    path.write_bytes(b"\0" * 32)
+    with pytest.raises(ValueError, match="not a compact durations file"):
+        CompactDurations(path)
+
+
+def test_profiler() -> None:
+    profiler = Profiler()
+    with profiler.phase("disabled"):
+        assert profiler.count(b"12345") == b"12345"
+    assert not profiler.phases
+    assert (profiler.files, profiler.bytes) == (1, 5)
+
+    profiler.enabled = True
+    with profiler.phase("read"):
+        profiler.count(b"123")
+        profiler.count(b"")
+        sum(range(100_000))
+    with profiler.phase("idle"):
+        pass
+    assert list(profiler.phases) == ["read", "idle"]
+    read = profiler.phases["read"]
+    assert (read["files"], read["bytes"]) == (2, 3)
+    assert read["wall"] > 0
+    assert read["cpu"] >= 0
+    assert read["peak_rss"] is None or read["peak_rss"] > 0
+    assert (profiler.phases["idle"]["files"], profiler.phases["idle"]["bytes"]) == (
+        0,
+        0,
+    )
+
+
+def test_print_removed(capsys: pytest.CaptureFixture) -> None:
+    print_removed("OS1", set())
+    assert not capsys.readouterr().out
+
+    print_removed("OS1", {"test_c[param-1]", "test_a", "test_b"}, limit=2)
+    out = capsys.readouterr().out
+    assert "tests not present in new durations, removing" in out
+    assert "- OS1::test_a\n- OS1::test_b\n- ... and 1 more\n" in out
+    assert "<details>" in out
+    assert "test_c" not in out
+
+
+def test_aggregate_old_durations_removed(
+    tmp_path: Path, capsys: pytest.CaptureFixture
+) -> None:
+    (tmp_path / "OS1.json").write_text(
+        json.dumps({"kept": 1.0, **{f"renamed[{i}]": 1.0 for i in range(100)}})
+    )
+    combined, _ = aggregate_old_durations(tmp_path, {"OS1": {"kept": [2.0]}})
+    assert combined == {"OS1": {"kept": [1.0, 2.0]}}
+    out = capsys.readouterr().out
+    assert out.count("not present in new durations") == 1
+    assert "OS1::renamed[0]" in out
+    assert "... and 50 more" in out
+
+
+def test_dump_summary_truncated(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("GITHUB_STEP_SUMMARY", str(summary := tmp_path / "summary"))
+    monkeypatch.setenv("GITHUB_OUTPUT", str(output := tmp_path / "output"))
+
+    console = SummaryConsole(color_system="standard", summary_limit=1_000)
+    for i in range(100):
+        console.print(f"⚠️ OS1::test_{i} not present in new durations, removing")
+    dump_summary(console)
+    assert len(summary.read_text().encode()) < 1_000 + len(TRUNCATED_NOTICE) + 100
+    assert summary.read_text().endswith(TRUNCATED_NOTICE)
+    assert TRUNCATED_NOTICE in output.read_text()
+
+
+def test_summary_console_boundaries() -> None:
+    console = SummaryConsole(color_system="standard", width=100, summary_limit=300)
+    console.print("<details>\n<summary>Tests</summary>\n", markup=False)
+    table = Table(box=box.MARKDOWN)
+    table.add_column("Test")
+    for i in range(20):
+        table.add_row(f"test_{i}")
+    console.print(table)
+
+    # the table doesn't fit and is dropped whole, the open block is closed
+    text = console.export_text()
+    assert "test_0" not in text
+    assert text == (
+        f"<details>\n<summary>Tests</summary>\n\n\n</details>\n{TRUNCATED_NOTICE}"
+    )
+
+    # a table that fits is recorded whole
+    console.print(table)
+    assert console.export_text().count("| test_") == 20
+
+
+def test_lazy_imports() -> None:
+    # numpy is only needed by the columnar aggregation & non-mean estimators
+    code = "import sys, combine_durations\nprint('numpy' in sys.modules)\n"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 2**16])
+@pytest.mark.parametrize("indent", [None, 4])
+def test_iter_durations(tmp_path: Path, chunk_size: int, indent: int | None) -> None:
+    data = {
+        "": 0.0,
+        "}": 1e300,
+        'tests/test_a.py::test_a[\\"é,:"]': -1.5e-07,
+        "tests/test_b.py::test_b": 12,
+        "tests/test_c.py::test_c": float("inf"),
+        "tests/test_d.py::test_d": 0.1234567890123,
+    }
+    path = tmp_path / "OS1.json"
+    path.write_text(json.dumps(data, indent=indent, sort_keys=True))
+    assert list(iter_durations(path, chunk_size)) == sorted(data.items())
+
+    path.write_text("{}")
+    assert not list(iter_durations(path, chunk_size))
+
+    for invalid in ('{"a": 1,}', '{"a" 1}', '{"a": 1e}', '{"a": 1', "[1]", ""):
+        path.write_text(invalid)
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_durations(path, chunk_size))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [{}, {"a": 1.0}, {"b": 0.1, "a": 2.5, "é": 1e-07}, {"a": float("nan")}],
+)
+def test_write_durations(tmp_path: Path, data: dict[str, float]) -> None:
+    write_durations(path := tmp_path / "OS1.json", sorted(data.items()))
+    assert path.read_text() == dump_durations(data)
+
+
+@pytest.mark.parametrize("unlink", [True, False])
+def test_merge_durations(tmp_path: Path, unlink: bool) -> None:
+    (artifacts := tmp_path / "artifacts").mkdir()
+    (merged := tmp_path / "merged").mkdir()
+    (expected := tmp_path / "expected").mkdir()
+    rng = random.Random(42)
+    for run in range(3):
+        for os_name in ("OS1", "OS2"):
+            data = {f"test_{i}": rng.random() for i in range(run, 200) if i % 7}
+            (path := artifacts / str(run) / os_name / f"{os_name}.json").parent.mkdir(
+                parents=True
+            )
+            path.write_text(json.dumps(data, sort_keys=True))
+    for durations in (merged, expected):
+        old = {f"test_{i}": 0.5 for i in range(100)}
+        (durations / "OS1.json").write_text(dump_durations(old))
+        (durations / "OS3.json").write_text(dump_durations(old))
+
+    new_stats, old_stats, drift = merge_durations(artifacts, merged, unlink=unlink)
+
+    # identical to the samples aggregation
+    combined, expected_new = aggregate_new_durations(artifacts)
+    combined, expected_old = aggregate_old_durations(expected, combined, unlink=unlink)
+    for os_name in ("OS1", "OS2"):
+        (expected / f"{os_name}.json").write_text(
+            dump_durations(estimate_durations(combined[os_name]))
+        )
+    assert sorted(path.name for path in merged.iterdir()) == sorted(
+        path.name for path in expected.iterdir()
+    )
+    for path in expected.iterdir():
+        assert (merged / path.name).read_text() == path.read_text()
+
+    for stats, expected_stats in ((new_stats, expected_new), (old_stats, expected_old)):
+        assert stats.keys() == expected_stats.keys()
+        for os_name, os_stats in stats.items():
+            assert tuple(os_stats) == pytest.approx(tuple(expected_stats[os_name]))
+
+    report = compute_drift(
+        {os_name: stats.durations() for os_name, stats in expected_old.items()},
+        {
+            os_name: estimate_durations(os_combined)
+            for os_name, os_combined in combined.items()
+        },
+    )
+    assert drift.report()["slowdowns"] == report["slowdowns"]
+    assert drift.report()["speedups"] == report["speedups"]
+    assert drift.oses["OS1"]["added"] == report["oses"]["OS1"]["added"]
+    assert drift.oses["OS1"]["removed"] == report["oses"]["OS1"]["removed"] == 15
+    assert drift.oses["OS1"]["delta"] == pytest.approx(report["oses"]["OS1"]["delta"])
+
+
+def test_merge_durations_unsorted(tmp_path: Path) -> None:
+    (path := tmp_path / "artifacts" / "1" / "OS1.json").parent.mkdir(parents=True)
+    path.write_text(json.dumps({"b": 1.0, "a": 2.0}))
+    (durations_dir := tmp_path / "durations").mkdir()
+    (old_path := durations_dir / "OS1.json").write_text(json.dumps({"a": 1.0}))
+    with pytest.raises(ValueError, match="is not sorted by key"):
+        merge_durations(tmp_path / "artifacts", durations_dir)
+
+    # the partially written file is removed, the previous durations are untouched
+    assert list(durations_dir.iterdir()) == [old_path]
+    assert json.loads(old_path.read_text()) == {"a": 1.0}
+
+
+def test_parse_args_batch(tmp_path: Path) -> None:
+    args = parse_args(["--batch", str(tmp_path / "batch.json")])
+    assert args.batch == tmp_path / "batch.json"
+    assert args.durations_dir is None
+
+    # the parent directory of the profile file is created
+    args = parse_args(
+        [
+            f"--durations-dir={tmp_path}",
+            f"--artifacts-dir={tmp_path}",
+            f"--profile-file={tmp_path / 'profile' / 'phases.json'}",
+        ]
+    )
+    assert args.profile_file == tmp_path / "profile" / "phases.json"
+    assert args.profile_file.parent.is_dir()
+    assert args.profile
+
+    for argv in (
+        [],
+        ["--durations-dir", str(tmp_path)],
+        ["--batch", str(tmp_path / "batch.json"), "--durations-dir", str(tmp_path)],
+        ["--batch", str(tmp_path / "batch.json"), "--profile-file", str(tmp_path)],
+        ["--batch", str(tmp_path / "batch.json"), "--max-samples", "0"],
+        # a directory is not a valid profile file
+        [
+            f"--durations-dir={tmp_path}",
+            f"--artifacts-dir={tmp_path}",
+            f"--profile-file={tmp_path}",
+        ],
+    ):
+        with pytest.raises(SystemExit):
+            parse_args(argv)
+
+
+def test_parse_args_aggregation(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    argv = [f"--durations-dir={tmp_path}", f"--artifacts-dir={tmp_path}"]
+    samples_file = f"--samples-file={tmp_path / 'samples.json'}"
+
+    # the estimators & outlier filters need every sample
+    for aggregation in ("samples", "columnar"):
+        args = parse_args(
+            [*argv, f"--aggregation={aggregation}", "--estimator=p90", "--outliers=iqr"]
+        )
+        assert (args.estimator, args.outliers) == ("p90", "iqr")
+    for aggregation in ("samples", "streaming"):
+        assert parse_args([*argv, f"--aggregation={aggregation}", samples_file])
+
+    for options, error in (
+        (["--aggregation=streaming", "--estimator=median"], "--estimator=median"),
+        (["--aggregation=merge", "--outliers=mad"], "--outliers=mad"),
+        ([samples_file, "--estimator=ewma"], "--estimator=ewma"),
+        (["--aggregation=columnar", samples_file], "cannot be used with"),
+    ):
+        with pytest.raises(SystemExit):
+            parse_args([*argv, *options])
+        assert error in capsys.readouterr().err
+
+
+def test_read_batch(tmp_path: Path) -> None:
+    entry = {"repository": "a/b", "artifacts-dir": "a", "durations-dir": "d"}
+    (path := tmp_path / "batch.json").write_text(json.dumps([entry]))
+    assert read_batch(path) == [entry]
+
+    for invalid, match in (
+        ({}, "must contain a list"),
+        ([{"repository": "a/b"}], "is missing artifacts-dir, durations-dir"),
+        ([{**entry, "shards": 2}], "has unknown shards"),
+        ([entry, entry], "is listed more than once"),
+    ):
+        path.write_text(json.dumps(invalid))
+        with pytest.raises(ValueError, match=match):
+            read_batch(path)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_combine_batch(
+    tmp_path: Path,
+    monkeypatch: MonkeyPatch,
+    capsys: pytest.CaptureFixture,
+    jobs: int,
+) -> None:
+    monkeypatch.setenv("GITHUB_OUTPUT", str(output := tmp_path / "output"))
+    entries = []
+    for repository in ("org/repo1", "org/repo2"):
+        root = tmp_path / repository
+        shutil.copytree(ARTIFACTS_DIR, root / "artifacts")
+        shutil.copytree(DURATIONS_DIR, root / "durations")
+        entries.append(
+            {
+                "repository": repository,
+                "artifacts-dir": str(root / "artifacts"),
+                "durations-dir": str(root / "durations"),
+                "report-file": str(root / "report.json"),
+            }
+        )
+    # a file is not a valid durations directory
+    entries.append(
+        {
+            "repository": "org/invalid",
+            "artifacts-dir": str(tmp_path / "org" / "repo1" / "artifacts"),
+            "durations-dir": str(tmp_path / "org" / "repo1" / "report.json"),
+        }
+    )
+    (batch := tmp_path / "batch.json").write_text(json.dumps(entries))
+
+    args = parse_args(["--batch", str(batch), "--jobs", str(jobs)])
+    assert combine_batch(args) == 1
+
+    # output is printed in manifest order
+    out = capsys.readouterr().out
+    assert out.index("#### org/repo1") < out.index("#### org/repo2")
+    assert out.index("#### org/repo2") < out.index("#### org/invalid")
+    assert "Failed to combine durations" in out
+    assert "Failed to combine" in out.split("#### Batch")[1]
+
+    key, value = output.read_text().rstrip("\n").split("=", 1)
+    assert key == "report"
+    reports = json.loads(value)["repositories"]
+    assert list(reports) == ["org/repo1", "org/repo2"]
+    for repository, report in reports.items():
+        report_file = tmp_path / repository / "report.json"
+        assert json.loads(report_file.read_text()) == report
+        assert (tmp_path / repository / "durations" / "OS1.json").exists()
+    assert reports["org/repo1"] == reports["org/repo2"]
+
+
+def test_combine_stats_table(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    shutil.copytree(ARTIFACTS_DIR, artifacts_dir := tmp_path / "artifacts")
+    shutil.copytree(DURATIONS_DIR, durations_dir := tmp_path / "durations")
+    argv = [
+        f"--artifacts-dir={artifacts_dir}",
+        f"--durations-dir={durations_dir}",
+        "--outliers=mad",
+    ]
+    combine(parse_args(argv))
+
+    # the summary is markdown, the 5 column table fits on a single header row
+    stats, *_ = parse_markdown_tables(capsys.readouterr().out)
+    assert stats == [
+        [
+            "OS",
+            "Number of tests",
+            "Total run time (min)",
+            "Average run time (sec)",
+            "Rejected samples",
+        ],
+        ["OS1", "5 (-1)", "0.10 (-0.00)", "1.14 (+0.14)", "0"],
+        ["OS2", "5 (-1)", "0.18 (-0.02)", "2.14 (+0.14)", "0"],
+    ]
+
+
+@pytest.mark.parametrize("aggregation", ["samples", "merge"])
+def test_combine_shards(
+    tmp_path: Path, capsys: pytest.CaptureFixture, aggregation: str
+) -> None:
+    shutil.copytree(ARTIFACTS_DIR, artifacts_dir := tmp_path / "artifacts")
+    shutil.copytree(DURATIONS_DIR, durations_dir := tmp_path / "durations")
+    argv = [
+        f"--artifacts-dir={artifacts_dir}",
+        f"--durations-dir={durations_dir}",
+        f"--aggregation={aggregation}",
+        "--shards=2",
+    ]
+    combine(parse_args(argv))
+
+    # every test is assigned to exactly one shard, slowest tests first
+    for os_name, makespans in (("OS1", [2.2, 3.2]), ("OS2", [4.2, 6.2])):
+        shards = json.loads((durations_dir / "shards" / f"{os_name}.json").read_text())
+        assert shards["shards"] == 2
+        assert shards["groups"] == [
+            ["tests/test_alpha.py::test_c", "tests/test_beta.py::test_b"],
+            [
+                "tests/test_alpha.py::test_a",
+                "tests/test_alpha.py::test_b",
+                "tests/test_beta.py::test_a",
+            ],
+        ]
+        assert shards["makespans"] == pytest.approx(makespans)
+    # the shards are not mistaken for duration files
+    assert sorted(path.name for path in durations_dir.glob("*.json")) == [
+        "OS1.json",
+        "OS2.json",
+    ]
+
+    tables = parse_markdown_tables(capsys.readouterr().out)
+    assert tables[1] == [
+        ["OS", "Shard", "Number of tests", "Predicted run time (min)"],
+        ["OS1", "1/2", "2", "0.04"],
+        ["OS1", "2/2", "3", "0.05 (makespan)"],
+        ["OS2", "1/2", "2", "0.07"],
+        ["OS2", "2/2", "3", "0.10 (makespan)"],
+    ]
+
+
+@pytest.mark.parametrize("aggregation", ["samples", "merge"])
+def test_combine_compact(
+    tmp_path: Path, capsys: pytest.CaptureFixture, aggregation: str
+) -> None:
+    shutil.copytree(ARTIFACTS_DIR, artifacts_dir := tmp_path / "artifacts")
+    shutil.copytree(DURATIONS_DIR, durations_dir := tmp_path / "durations")
+    argv = [
+        f"--artifacts-dir={artifacts_dir}",
+        f"--durations-dir={durations_dir}",
+        f"--aggregation={aggregation}",
+        "--compact",
+    ]
+    combine(parse_args(argv))
+
+    # the compact files hold the same durations as the JSON files
+    for os_name in ("OS1", "OS2"):
+        durations = json.loads((durations_dir / f"{os_name}.json").read_text())
+        assert len(durations) == 5
+        with CompactDurations(durations_dir / f"{os_name}.cdur") as compact:
+            assert list(compact) == list(durations)
+            assert list(compact.values()) == pytest.approx(
+                list(durations.values()), rel=1e-6
+            )
+
+    # the summary is unchanged
+    stats, *_ = parse_markdown_tables(capsys.readouterr().out)
+    assert [row[:2] for row in stats] == [
+        ["OS", "Number of tests"],
+        ["OS1", "5 (-1)"],
+        ["OS2", "5 (-1)"],
+    ]
+
+
+@pytest.mark.parametrize("options", [[], ["--estimator=median", "--outliers=mad"]])
+def test_combine_columnar(
+    tmp_path: Path, capsys: pytest.CaptureFixture, options: list[str]
+) -> None:
+    # columnar writes the same durations & summary as samples
+    outputs = {}
+    for aggregation in ("samples", "columnar"):
+        root = tmp_path / aggregation
+        shutil.copytree(ARTIFACTS_DIR, artifacts_dir := root / "artifacts")
+        shutil.copytree(DURATIONS_DIR, durations_dir := root / "durations")
+        argv = [
+            f"--artifacts-dir={artifacts_dir}",
+            f"--durations-dir={durations_dir}",
+            f"--aggregation={aggregation}",
+            *options,
+        ]
+        combine(parse_args(argv))
+        outputs[aggregation] = (
+            {
+                path.name: json.loads(path.read_text())
+                for path in sorted(durations_dir.glob("*.json"))
+            },
+            parse_markdown_tables(capsys.readouterr().out)[0],
+        )
+
+    durations, stats = outputs["samples"]
+    cdurations, cstats = outputs["columnar"]
+    assert list(cdurations) == list(durations) == ["OS1.json", "OS2.json"]
+    for name, os_durations in durations.items():
+        assert list(cdurations[name]) == list(os_durations)
+        assert list(cdurations[name].values()) == pytest.approx(
+            list(os_durations.values())
+        )
+    assert cstats == stats
+
+
+def test_combine_profile(
+    tmp_path: Path, capsys: pytest.CaptureFixture, monkeypatch: MonkeyPatch
+) -> None:
+    shutil.copytree(ARTIFACTS_DIR, artifacts_dir := tmp_path / "artifacts")
+    shutil.copytree(DURATIONS_DIR, durations_dir := tmp_path / "durations")
+    argv = [f"--artifacts-dir={artifacts_dir}", f"--durations-dir={durations_dir}"]
+
+    profile_file = tmp_path / "profile" / "phases.json"
+    combine(parse_args([*argv, f"--profile-file={profile_file}"]))
+    phases = json.loads(profile_file.read_text())
+    assert list(phases) == [
+        "discover",
+        "aggregate_new",
+        "aggregate_old",
+        "stats",
+        "estimate",
+        "write",
+        "drift",
+    ]
+    assert phases["aggregate_new"]["files"] == 4
+
+    # the profile is the last table, phase names & the header aren't wrapped
+    out = capsys.readouterr().out
+    assert "\nProfile\n" in out
+    header, *rows = parse_markdown_tables(out)[-1]
+    assert header == [
+        "Phase",
+        "Wall (sec)",
+        "CPU (sec)",
+        "Files read",
+        "Read (MiB)",
+        "Peak RSS (MiB)",
+    ]
+    assert [row[0] for row in rows] == list(phases)
+
+    # the environment variable is parsed as a boolean
+    for value, enabled in (("1", True), ("true", True), ("0", False), ("off", False)):
+        monkeypatch.setenv("COMBINE_DURATIONS_PROFILE", value)
+        assert parse_args(argv).profile is enabled
+        assert parse_args([*argv, "--profile"]).profile
+    monkeypatch.setenv("COMBINE_DURATIONS_PROFILE", "maybe")
+    with pytest.raises(SystemExit):
+        parse_args(argv)
+
+
+@pytest.mark.parametrize("aggregation", ["samples", "merge"])
+def test_combine_runs_manifest(
+    tmp_path: Path, capsys: pytest.CaptureFixture, aggregation: str
+) -> None:
+    shutil.copytree(ARTIFACTS_DIR, artifacts_dir := tmp_path / "artifacts")
+    shutil.copytree(DURATIONS_DIR, durations_dir := tmp_path / "durations")
+    # OS2 has already been ingested
+    (manifest := tmp_path / "runs.txt").write_text("OS2_run1\nOS2_run2\n")
+    argv = [
+        f"--artifacts-dir={artifacts_dir}",
+        f"--durations-dir={durations_dir}",
+        f"--runs-manifest={manifest}",
+        f"--aggregation={aggregation}",
+    ]
+
+    report = combine(parse_args(argv))
+    out = capsys.readouterr().out
+    assert "--runs-manifest without --samples-file" in out
+    # an OS without new runs is kept, but neither compared nor listed as removed
+    assert (durations_dir / "OS2.json").read_text() == (
+        DURATIONS_DIR / "OS2.json"
+    ).read_text()
+    assert "| OS1 " in out
+    assert "| OS2 " not in out
+    assert set(report["oses"]) == {"OS1"}
+    assert read_manifest(manifest) == {"OS1_run1", "OS1_run2", "OS2_run1", "OS2_run2"}
+
+    # a run that fails to ingest is not listed, so it is read again next time
+    (artifacts_dir / "OS1_run3").mkdir()
+    (artifacts_dir / "OS1_run3" / "OS1.json").write_text("{")
+    with pytest.raises(ValueError):
+        combine(parse_args(argv))
+    assert "OS1_run3" not in read_manifest(manifest)
+
+
+def test_outlier_filters() -> None:
+    samples = np.array(
+        [
+            [1.0, 1.1, 0.9, 1.0, 30.0],  # network stall
+            [1.0, 1.0, 1.0, 1.0, 1.0],  # identical samples are never rejected
+            [1.0, 2.0, 3.0, 4.0, 5.0],
+            [1.0, 1.0, 1.0, 1.0, 9.0],  # MAD is 0
+        ]
+    )
+    for inliers in (mad_inliers, iqr_inliers):
+        keep = inliers(samples)
+        assert keep.shape == samples.shape
+        assert keep[:3].tolist() == [
+            [True, True, True, True, False],
+            [True] * 5,
+            [True] * 5,
+        ]
+        assert not keep[3, 4]
+        # a larger threshold rejects less
+        assert inliers(samples, threshold=1e6)[:3].all()
+
+
+@pytest.mark.parametrize("method", ["mad", "iqr"])
+def test_reject_outliers(method: str) -> None:
+    combined = {
+        "test_a": [1.0, 1.1, 0.9, 1.0, 30.0],
+        "test_b": [2.0, 2.2, 2.4, 2.6],
+        "test_c": [1.0, 50.0],  # too few samples to reject
+    }
+    filtered, rejected = reject_outliers(combined, method)
+    assert rejected == 1
+    assert filtered == {
+        "test_a": [1.0, 1.1, 0.9, 1.0],
+        "test_b": [2.0, 2.2, 2.4, 2.6],
+        "test_c": [1.0, 50.0],
+    }
+    # the input is not modified
+    assert len(combined["test_a"]) == 5
+
+    # columnar durations reject the same samples (in place)
+    columnar = ColumnarDurations()
+    for i in range(5):
+        columnar.add(
+            {key: values[i] for key, values in combined.items() if i < len(values)},
+            oldest=i == 0,
+        )
+    assert reject_outliers(columnar, method) == (columnar, 1)
+    assert columnar.estimate("median") == pytest.approx(
+        estimate_durations(filtered, "median")
+    )
+    assert columnar.number_of_tests == 3
+
+
+def test_stats_table_rejected() -> None:
+    stats = {"OS1": DurationStats()}
+    stats["OS1"].add({"test_a": 1.0})
+    console = Console(file=StringIO(), color_system=None, width=200)
+    console.print(build_stats_table(stats, stats, {"OS1": 7}))
+    header, _, row = console.file.getvalue().strip().splitlines()
+    assert "Rejected samples" in header
+    assert row.rstrip("| ").endswith("7")
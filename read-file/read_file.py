@@ -8,10 +8,6 @@ from argparse import ArgumentParser
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import requests
-import yaml
-from requests.exceptions import HTTPError, MissingSchema
-
 if TYPE_CHECKING:
     from argparse import Namespace
     from collections.abc import Sequence
@@ -46,20 +42,26 @@ def parse_args(argv: Sequence[str] | None = None) -> Namespace:
 
 
 def read_file(file: str | os.PathLike[str] | Path, default: str | None) -> str:
-    try:
-        response = requests.get(file)
-        response.raise_for_status()
-    except (HTTPError, MissingSchema):
-        # HTTPError: if the response status code is not ok
-        # MissingSchema: if the URL is not valid
+    # only remote URLs need requests, local paths are read without importing it
+    if "://" in str(file):
+        import requests
+        from requests.exceptions import HTTPError
+
         try:
-            return Path(file).read_text()
-        except FileNotFoundError:
-            if default is None:
-                raise
-            return default
-    else:
-        return response.text
+            response = requests.get(file)
+            response.raise_for_status()
+        except HTTPError:
+            # HTTPError: if the response status code is not ok
+            pass
+        else:
+            return response.text
+
+    try:
+        return Path(file).read_text()
+    except FileNotFoundError:
+        if default is None:
+            raise
+        return default
 
 
 def parse_content(content: str, parser: Literal["json", "yaml"]) -> str:
@@ -68,6 +70,8 @@ def parse_content(content: str, parser: Literal["json", "yaml"]) -> str:
         content = json.loads(content)
         return json.dumps(content)
     elif parser == "yaml":
+        import yaml
+
         content = yaml.safe_load(content)
         return json.dumps(content)
     else:
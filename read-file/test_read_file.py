@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import subprocess
+import sys
 from argparse import Namespace
 from contextlib import nullcontext, suppress
 from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
@@ -166,3 +168,20 @@ def test_dump_output(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
 
     dump_output("more")
     assert output.read_text() == content + get_output("more")
+
+
+def test_lazy_imports() -> None:
+    # reading a local file doesn't import the remote/YAML dependencies
+    code = (
+        "import sys, read_file\n"
+        "read_file.read_file('missing', 'default')\n"
+        "print(*sorted({'requests', 'yaml'} & sys.modules.keys()))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert not result.stdout.strip()
@@ -0,0 +1,167 @@
+"""Jinja environment that audits the stubs & context used by each template."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from contextlib import contextmanager
+from hashlib import sha256
+from typing import TYPE_CHECKING
+
+from jinja2.environment import Environment
+from jinja2.runtime import Context, Undefined
+from jinja2.utils import missing
+from wrapt import ObjectProxy
+
+if TYPE_CHECKING:
+    import weakref
+    from collections.abc import Iterator, MutableMapping
+    from typing import Any
+
+    from jinja2 import nodes
+    from jinja2.environment import Template
+    from jinja2.loaders import BaseLoader
+
+    AuditCurrent = tuple[str, str, str]
+    AuditCounter = dict[str, int]
+    AuditRegister = dict[str, Any]
+    StubsCacheKey = tuple[weakref.ref[BaseLoader], str]
+
+
+class AuditStubs(ObjectProxy):
+    # see jinja2.environment.Environment._load_template
+    def __init__(
+        self, environment: Environment, cache: MutableMapping[StubsCacheKey, Template]
+    ) -> None:
+        super().__init__(cache)
+        self._self_environment = environment
+
+    @property
+    def environment(self) -> Environment:
+        return self._self_environment
+
+    def count(
+        self,
+        key: str,
+        increment: int | None = None,
+        *,
+        hit: bool = False,
+    ) -> None:
+        # count template usage
+        if None not in (
+            current := getattr(self.environment, "current", None),
+            stubs := getattr(self.environment, "stubs", None),
+        ):
+            if increment is not None:
+                stubs[current][key] += increment
+            elif hit:
+                # check cache was previously a bust
+                assert stubs[current][key] == -1
+                # override cache bust with a hit
+                stubs[current][key] = +1
+
+    def get(self, key: StubsCacheKey, default: Any = None) -> Template:
+        try:
+            value = self.__wrapped__[key]
+        except KeyError:
+            # KeyError: key does not exist
+            self.count(key[-1], -1)
+            return default
+        else:
+            self.count(key[-1], +1)
+            return value
+
+    def __setitem__(self, key: StubsCacheKey, value: Template) -> None:
+        self.__wrapped__[key] = value
+        self.count(key[-1], hit=True)
+
+
+class AuditContext(Context):
+    def register(self, environment: Environment, key: str, value: Any) -> None:
+        # register variable usage, no point to count usage since it will always be 1
+        if None not in (
+            current := getattr(environment, "current", None),
+            variables := getattr(environment, "variables", None),
+        ):
+            variables[current][key] = value
+
+    def resolve_or_missing(self, key: str) -> Any:
+        # delegate to Context
+        value = super().resolve_or_missing(key)
+        # register variable usage
+        self.register(self.environment, key, value)
+        return value
+
+
+class AuditEnvironment(Environment):
+    current: tuple[str, str, str] | None = None
+    stubs: dict[AuditCurrent, AuditCounter]
+    variables: dict[AuditCurrent, AuditRegister]
+    compiled: dict[str, Template]
+
+    context_class: type[Context] = AuditContext
+    undefined: type[Undefined]
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stubs = defaultdict(lambda: defaultdict(int))
+        self.variables = defaultdict(dict)
+        self.cache = AuditStubs(self, self.cache)
+        # templates compiled from source, by content hash
+        self.compiled = {}
+
+    def from_string(
+        self,
+        source: str | nodes.Template,
+        globals: MutableMapping[str, Any] | None = None,
+        template_class: type[Template] | None = None,
+    ) -> Template:
+        if globals or template_class or not isinstance(source, str):
+            return super().from_string(source, globals, template_class)
+
+        # the same source (e.g., templated to several destinations) is only compiled
+        # once, stubs are loaded (and audited) when rendering so they are unaffected
+        key = sha256(source.encode()).hexdigest()
+        try:
+            return self.compiled[key]
+        except KeyError:
+            # KeyError: source was not compiled before
+            pass
+
+        # see jinja2.loaders.BaseLoader.load
+        code = None
+        if (bcc := self.bytecode_cache) is not None:
+            bucket = bcc.get_bucket(self, key, None, source)
+            code = bucket.code
+        if code is None:
+            code = self.compile(source)
+            if bcc is not None:
+                bucket.code = code
+                bcc.set_bucket(bucket)
+
+        template = self.template_class.from_code(self, code, self.make_globals(None))
+        self.compiled[key] = template
+        return template
+
+    @contextmanager
+    def audit(
+        self, file: str, src: str, dst: str
+    ) -> Iterator[tuple[AuditCounter, AuditRegister]]:
+        class AuditUndefined(Undefined):
+            # this is used to distinguish between optional and missing context values
+            def __str__(slf) -> str:
+                # only store undefined variables, ignore missing attributes/elements
+                if slf._undefined_obj is missing and self.current:
+                    self.variables[self.current][slf._undefined_name] = slf
+                return super().__str__()
+
+        stored_undefined = self.undefined
+        try:
+            # set current file & custom undefined
+            self.current = (file, src, dst)
+            self.undefined = AuditUndefined
+
+            yield self.stubs[self.current], self.variables[self.current]
+        finally:
+            # clear current file & reset undefined
+            self.current = None
+            self.undefined = stored_undefined
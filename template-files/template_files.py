@@ -2,48 +2,122 @@
 
 from __future__ import annotations
 
+import json
 import os
+import re
+import subprocess
 import sys
 from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from base64 import b64encode
 from collections import defaultdict
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from difflib import unified_diff
 from enum import Enum
 from functools import cache
+from hashlib import sha256
 from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
 
-import yaml
-from github import Auth, Github, UnknownObjectException
-from jinja2.environment import Environment
-from jinja2.loaders import FileSystemLoader
-from jinja2.runtime import Context, Undefined
-from jinja2.utils import missing
-from jsonschema import validate
 from rich import box
 from rich.console import Console, ConsoleOptions, RenderResult
 from rich.measure import Measurement
 from rich.padding import Padding
+from rich.segment import Segment
 from rich.table import Table
-from wrapt import ObjectProxy
 
 if TYPE_CHECKING:
-    import weakref
-    from collections.abc import Iterator, MutableMapping, Sequence
+    from collections.abc import Iterable, Sequence
+    from concurrent.futures import Future
     from typing import Any
 
+    from github import Github
     from github.Repository import Repository
-    from jinja2.environment import Template
-    from jinja2.loaders import BaseLoader
+    from jinja2.environment import Environment
     from jinja2.style import Style
 
-    AuditCurrent = tuple[str, str, str]
-    AuditCounter = dict[str, int]
-    AuditRegister = dict[str, Any]
-    StubsCacheKey = tuple[weakref.ref[BaseLoader], str]
-
 
 INDENT = 4
-CONSOLE = Console(color_system="standard", width=100_000_000, record=True)
+#: number of upstream files fetched concurrently
+JOBS = 8
+#: where upstreams are cloned from with `--fetch=git`
+GIT_URL = "https://github.com/{repository}.git"
+#: GitHub rejects step summaries larger than 1 MiB, leave room for the heading
+SUMMARY_LIMIT = 2**20 - 2**10
+TRUNCATED_NOTICE = (
+    "\n> [!WARNING]\n"
+    "> Summary truncated to 1 MiB, see the job log for the full output.\n"
+)
+DETAILS_OPEN_RE = re.compile(r"<details[\s>]")
+
+
+class BoundedRecord(list):
+    """Console record buffer that stops recording past `limit` bytes.
+
+    Keeps the summary below GitHub's step summary limit without holding the entire
+    console output in memory, anything past the limit is replaced by a notice.
+
+    The console records each flushed render (e.g., a whole table or `<details>`
+    block) with a single `extend`, which is kept or dropped as a whole so the
+    summary is only ever cut between renders. `<details>` blocks left open by
+    earlier renders are closed before the notice.
+
+    Each action is self-contained, keep in sync with
+    `combine-durations/combine_durations.py`.
+    """
+
+    def __init__(self, limit: int = SUMMARY_LIMIT) -> None:
+        super().__init__()
+        self.limit = limit
+        self.size = 0
+        self.details = 0
+        self.truncated = False
+
+    def extend(self, segments: Iterable[Segment]) -> None:
+        if self.truncated:
+            return
+        segments = [segment for segment in segments if not segment.control]
+        text = "".join(segment.text for segment in segments)
+        size = len(text.encode())
+        if self.size + size > self.limit:
+            self.truncated = True
+            # the notice starts with a blank line, which also ends a markdown table
+            self.append(Segment("\n</details>\n" * self.details + TRUNCATED_NOTICE))
+            return
+        self.size += size
+        self.details += count_details(text)
+        super().extend(segments)
+
+    def __delitem__(self, key: int | slice) -> None:
+        # the console clears the record with `del record[:]` when exporting
+        super().__delitem__(key)
+        text = "".join(segment.text for segment in self)
+        self.size = len(text.encode())
+        self.details = count_details(text)
+        self.truncated = False
+
+    def clear(self) -> None:
+        del self[:]
+
+
+def count_details(text: str) -> int:
+    # number of `<details>` blocks opened but not closed
+    return len(DETAILS_OPEN_RE.findall(text)) - text.count("</details>")
+
+
+class SummaryConsole(Console):
+    """Recording console whose record is bounded by `summary_limit` bytes."""
+
+    def __init__(self, *args, summary_limit: int = SUMMARY_LIMIT, **kwargs) -> None:
+        super().__init__(*args, record=True, **kwargs)
+        # rich has no public hook for the record, this replaces the private
+        # `Console._record_buffer` list which is extended once per flushed render and
+        # cleared with `del [:]`/`clear()` (checked against rich 12.6, 13.9 & 15.0)
+        self._record_buffer = BoundedRecord(summary_limit)
+
+
+CONSOLE = SummaryConsole(color_system="standard", width=100_000_000)
 
 
 def print(renderable, *, indent: int = 0, console: Console = CONSOLE, **kwargs) -> None:
@@ -87,6 +161,9 @@ class TemplateState(Enum):
 
     @classmethod
     def from_value(cls, value: Any) -> TemplateState:
+        from jinja2.runtime import Undefined
+        from jinja2.utils import missing
+
         if isinstance(value, Undefined):
             return cls.MISSING
         if value is missing:
@@ -134,110 +211,6 @@ class TemplateState(Enum):
         return Measurement(size, size)
 
 
-class AuditStubs(ObjectProxy):
-    # see jinja2.environment.Environment._load_template
-    def __init__(
-        self, environment: Environment, cache: MutableMapping[StubsCacheKey, Template]
-    ) -> None:
-        super().__init__(cache)
-        self._self_environment = environment
-
-    @property
-    def environment(self) -> Environment:
-        return self._self_environment
-
-    def count(
-        self,
-        key: str,
-        increment: int | None = None,
-        *,
-        hit: bool = False,
-    ) -> None:
-        # count template usage
-        if None not in (
-            current := getattr(self.environment, "current", None),
-            stubs := getattr(self.environment, "stubs", None),
-        ):
-            if increment is not None:
-                stubs[current][key] += increment
-            elif hit:
-                # check cache was previously a bust
-                assert stubs[current][key] == -1
-                # override cache bust with a hit
-                stubs[current][key] = +1
-
-    def get(self, key: StubsCacheKey, default: Any = None) -> Template:
-        try:
-            value = self.__wrapped__[key]
-        except KeyError:
-            # KeyError: key does not exist
-            self.count(key[-1], -1)
-            return default
-        else:
-            self.count(key[-1], +1)
-            return value
-
-    def __setitem__(self, key: StubsCacheKey, value: Template) -> None:
-        self.__wrapped__[key] = value
-        self.count(key[-1], hit=True)
-
-
-class AuditContext(Context):
-    def register(self, environment: Environment, key: str, value: Any) -> None:
-        # register variable usage, no point to count usage since it will always be 1
-        if None not in (
-            current := getattr(environment, "current", None),
-            variables := getattr(environment, "variables", None),
-        ):
-            variables[current][key] = value
-
-    def resolve_or_missing(self, key: str) -> Any:
-        # delegate to Context
-        value = super().resolve_or_missing(key)
-        # register variable usage
-        self.register(self.environment, key, value)
-        return value
-
-
-class AuditEnvironment(Environment):
-    current: tuple[str, str, str] | None = None
-    stubs: dict[AuditCurrent, AuditCounter]
-    variables: dict[AuditCurrent, AuditRegister]
-
-    context_class: type[Context] = AuditContext
-    undefined: type[Undefined]
-
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.stubs = defaultdict(lambda: defaultdict(int))
-        self.variables = defaultdict(dict)
-        self.cache = AuditStubs(self, self.cache)
-
-    @contextmanager
-    def audit(
-        self, file: str, src: str, dst: str
-    ) -> Iterator[tuple[AuditCounter, AuditRegister]]:
-        class AuditUndefined(Undefined):
-            # this is used to distinguish between optional and missing context values
-            def __str__(slf) -> str:
-                # only store undefined variables, ignore missing attributes/elements
-                if slf._undefined_obj is missing and self.current:
-                    self.variables[self.current][slf._undefined_name] = slf
-                return super().__str__()
-
-        stored_undefined = self.undefined
-        try:
-            # set current file & custom undefined
-            self.current = (file, src, dst)
-            self.undefined = AuditUndefined
-
-            yield self.stubs[self.current], self.variables[self.current]
-        finally:
-            # clear current file & reset undefined
-            self.current = None
-            self.undefined = stored_undefined
-
-
 def validate_file(value: str) -> Path | None:
     try:
         path = Path(value).expanduser().resolve()
@@ -266,15 +239,73 @@ def validate_dir(value: str) -> Path:
         raise ArgumentTypeError(f"{value} is not a valid directory: {err}")
 
 
+def validate_jobs(value: str) -> int:
+    try:
+        jobs = int(value)
+        if jobs < 1:
+            raise ValueError("must be a positive number")
+        return jobs
+    except ValueError as err:
+        # ValueError: value is not a number or not positive
+        raise ArgumentTypeError(f"{value} is not a valid number of jobs: {err}")
+
+
 def parse_args(args: Sequence[str] | None = None) -> Namespace:
     # parse CLI for inputs
     parser = ArgumentParser()
     parser.add_argument("--config", type=validate_file, required=True)
     parser.add_argument("--stubs", type=validate_dir, required=True)
+    parser.add_argument(
+        "--jobs",
+        type=validate_jobs,
+        default=JOBS,
+        help="Number of upstream files fetched concurrently.",
+    )
+    parser.add_argument(
+        "--fetch",
+        choices=["contents", "git"],
+        default="contents",
+        help=(
+            "How to fetch upstream files, `contents` makes a GitHub API request per "
+            "file while `git` makes a single shallow clone per upstream."
+        ),
+    )
+    parser.add_argument(
+        "--git-url",
+        default=GIT_URL,
+        help="URL template ({repository} is the upstream) to clone with --fetch=git.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=(
+            "Do not write (or remove) any files, report a unified diff of every file "
+            "that would change instead."
+        ),
+    )
+    parser.add_argument(
+        "--bytecode-cache",
+        type=validate_dir,
+        help=(
+            "Directory to cache compiled templates (and stubs) in, unchanged "
+            "templates are not compiled again in later runs."
+        ),
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=validate_dir,
+        help=(
+            "Persistent cache of upstream files, files are only downloaded again "
+            "once the upstream's default branch moves."
+        ),
+    )
     return parser.parse_args(args)
 
 
 def read_config(config: Path) -> dict:
+    import yaml
+    from jsonschema import validate
+
     # read and validate configuration file
     config = yaml.load(
         config.read_text(),
@@ -353,7 +384,14 @@ def parse_config(file: str | dict) -> tuple[str | None, Path, bool, dict[str, An
     return src, dst, remove, context
 
 
-def remove_file(dst: Path) -> int:
+def remove_file(dst: Path, dry_run: bool = False) -> int:
+    if dry_run:
+        if dst.exists():
+            print(f"* :cross_mark_button: `{dst}` would be removed")
+        else:
+            print(f"* :warning-emoji: `{dst}` already removed", indent=INDENT)
+        return 0  # no errors
+
     try:
         dst.unlink()
     except FileNotFoundError:
@@ -369,6 +407,49 @@ def remove_file(dst: Path) -> int:
     return 0  # no errors
 
 
+def format_diff(old: str, new: str, dst: Path) -> str:
+    lines = []
+    for line in unified_diff(
+        old.splitlines(keepends=True),
+        new.splitlines(keepends=True),
+        f"a/{dst}",
+        f"b/{dst}",
+    ):
+        if not line.endswith("\n"):
+            line += "\n\\ No newline at end of file\n"
+        lines.append(line)
+    return "".join(lines)
+
+
+def update_file(dst: Path, content: str, dry_run: bool = False) -> tuple[bool, str]:
+    """Write `content` to `dst` unless it is unchanged, returns (changed, diff).
+
+    Sizes are compared first so the existing file is only read if the sizes match (or
+    for the diff of a dry run), and it is read at most once.
+    """
+    data = content.encode()
+    try:
+        if dst.stat().st_size != len(data) and not dry_run:
+            old = None
+        else:
+            old = dst.read_bytes()
+    except FileNotFoundError:
+        # FileNotFoundError: dst does not exist (yet)
+        old = b""
+        changed = True
+    else:
+        changed = old != data
+
+    if not changed:
+        return False, ""
+    elif dry_run:
+        return True, format_diff(old.decode(errors="replace"), content, dst)
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    dst.write_bytes(data)
+    return True, ""
+
+
 def template_file(
     env: Environment,
     current_repo: Repository,
@@ -376,7 +457,12 @@ def template_file(
     src: str | None,
     dst: Path,
     context: dict[str, Any],
+    dry_run: bool = False,
 ) -> int:
+    from github import UnknownObjectException
+    from jinja2.runtime import Undefined
+    from jinja2.utils import missing
+
     # fetch src file
     try:
         content = upstream_repo.get_contents(src).decoded_content.decode()
@@ -400,8 +486,9 @@ def template_file(
     with env.audit(upstream_repo.full_name, src, dst) as (stubs, variables):
         try:
             template = env.from_string(content)
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            dst.write_text(template.render(**{**context, **standard_context}))
+            changed, diff = update_file(
+                dst, template.render(**{**context, **standard_context}), dry_run
+            )
         except Exception as err:
             # Exception: catch all errors whether they are Jinja2 or Python errors
             perror(f"* :cross_mark: Failed to template `{src}`: {err}", indent=INDENT)
@@ -433,14 +520,41 @@ def template_file(
                 value = context[variable]
                 table.add_row("*", TemplateState.UNUSED, f"`{variable}={value}`")
 
+        if not changed:
+            status = " (unchanged)"
+        elif dry_run:
+            status = " (would change)"
+        else:
+            status = ""
         if error:
-            perror(f"* :cross_mark: Context missing `{src}` → `{dst}`", indent=INDENT)
+            perror(
+                f"* :cross_mark: Context missing `{src}` → `{dst}`{status}",
+                indent=INDENT,
+            )
         elif warning:
-            print(f"* :warning-emoji: `{src}` → `{dst}`", indent=INDENT)
+            print(f"* :warning-emoji: `{src}` → `{dst}`{status}", indent=INDENT)
         else:
-            print(f"* :white_check_mark: `{src}` → `{dst}`", indent=INDENT)
+            print(f"* :white_check_mark: `{src}` → `{dst}`{status}", indent=INDENT)
         if table:
             print(table, indent=INDENT * 2)
+        if diff:
+            # the fence must be longer than any backtick run in the diff (e.g., when
+            # templating markdown) or it is closed early
+            longest = max(map(len, re.findall(r"`+", diff)), default=0)
+            fence = "`" * max(3, longest + 1)
+            print(
+                f"<details>\n"
+                f"<summary>Diff of `{dst}`</summary>\n"
+                f"\n"
+                f"{fence}diff\n"
+                f"{diff}"
+                f"{fence}\n"
+                f"\n"
+                f"</details>",
+                markup=False,
+                emoji=False,
+                highlight=False,
+            )
 
         return int(error)
 
@@ -451,6 +565,8 @@ class LocalContents:
         try:
             self.decoded_content = path.read_text().encode()
         except FileNotFoundError as err:
+            from github import UnknownObjectException
+
             raise UnknownObjectException(404, f"{path} not found") from err
 
 
@@ -474,45 +590,371 @@ class LocalRepository:
         return LocalContents(self.path / path)
 
 
+class BlobContents:
+    # mirror GitHub contents object, for contents already in memory
+    def __init__(self, content: bytes) -> None:
+        self.decoded_content = content
+
+
+def get_git_env(url: str) -> dict[str, str]:
+    # authenticate HTTPS clones of GitHub with the token (via the environment, not the
+    # arguments), any other host (e.g., a custom --git-url) never receives the token
+    env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    hosts = {"github.com", urlsplit(os.getenv("GITHUB_SERVER_URL", "")).hostname}
+    hosts.discard(None)
+    parts = urlsplit(url)
+    if (
+        parts.scheme == "https"
+        and parts.hostname in hosts
+        and (token := os.getenv("GITHUB_TOKEN"))
+    ):
+        credentials = b64encode(f"x-access-token:{token}".encode()).decode()
+        env.update(
+            GIT_CONFIG_COUNT="1",
+            # scoped to the host so redirects elsewhere are not authenticated either
+            GIT_CONFIG_KEY_0=f"http.https://{parts.netloc}/.extraHeader",
+            GIT_CONFIG_VALUE_0=f"Authorization: Basic {credentials}",
+        )
+    return env
+
+
+def get_git_head(url: str) -> str:
+    from github import UnknownObjectException
+
+    try:
+        # commit SHA of the default branch, without fetching anything
+        output = subprocess.run(
+            ["git", "ls-remote", url, "HEAD"],
+            env=get_git_env(url),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except subprocess.CalledProcessError as err:
+        # CalledProcessError: repository does not exist (or is not accessible)
+        raise UnknownObjectException(
+            404, f"Failed to read {url}: {err.stderr.strip()}"
+        ) from err
+    return output.split()[0]
+
+
+def fetch_git(url: str, paths: Iterable[str]) -> dict[str, bytes]:
+    from github import UnknownObjectException
+
+    # nothing to fetch (e.g., everything is cached)
+    if not (paths := list(paths)):
+        return {}
+
+    with TemporaryDirectory() as tmp:
+        try:
+            # a single shallow fetch of the default branch
+            subprocess.run(
+                ["git", "clone", "--bare", "--depth=1", "--quiet", url, tmp],
+                env=get_git_env(url),
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+        except subprocess.CalledProcessError as err:
+            # CalledProcessError: repository does not exist (or is not accessible)
+            raise UnknownObjectException(
+                404, f"Failed to clone {url}: {err.stderr.strip()}"
+            ) from err
+
+        # read every path in one go, each is reported as `<sha> <type> <size>` followed
+        # by its content or as `<object> missing`
+        output = subprocess.run(
+            ["git", "cat-file", "--batch"],
+            cwd=tmp,
+            input="".join(f"HEAD:{path}\n" for path in paths).encode(),
+            capture_output=True,
+            check=True,
+        ).stdout
+
+    contents = {}
+    offset = 0
+    for path in paths:
+        end = output.index(b"\n", offset)
+        header = output[offset:end].split()
+        offset = end + 1
+        if header[-1] == b"missing":
+            continue
+        size = int(header[2])
+        if header[1] == b"blob":
+            contents[path] = output[offset : offset + size]
+        offset += size + 1
+    return contents
+
+
+class GitRepository:
+    # mirror GitHub repository object, backed by a single shallow clone
+    def __init__(self, full_name: str, url: str, paths: Iterable[str]) -> None:
+        self.full_name = full_name
+        self.user, _, self.name = full_name.partition("/")
+        self.html_url = url.removesuffix(".git")
+        self.contents = fetch_git(url, paths)
+
+    def get_contents(self, path: str) -> BlobContents:
+        try:
+            return BlobContents(self.contents[path])
+        except KeyError as err:
+            # KeyError: path does not exist (or is not a file)
+            from github import UnknownObjectException
+
+            raise UnknownObjectException(404, f"{path} not found") from err
+
+
+class SourceCache:
+    """Content-addressed on-disk cache of upstream files.
+
+    Contents are stored once per SHA-256 digest in `blobs/`, `refs/<upstream>.json`
+    maps the paths of an upstream to their digests as of its last seen head commit.
+    Blobs the current run did not use are pruned so the cache does not grow with
+    every upstream change.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # digests read or written by the current run
+        self.used: set[str] = set()
+
+    def _ref(self, repository: str) -> Path:
+        return self.path / "refs" / f"{repository}.json"
+
+    def _blob(self, digest: str) -> Path:
+        return self.path / "blobs" / digest
+
+    def _write(self, path: Path, content: bytes) -> None:
+        # write atomically, concurrent readers never see a partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=path.parent, delete=False) as tmp:
+            tmp.write(content)
+        os.replace(tmp.name, path)
+
+    def load(self, repository: str, head: str) -> dict[str, str]:
+        # cached paths of `head` (nothing if the upstream moved since)
+        try:
+            ref = json.loads(self._ref(repository).read_text())
+        except (FileNotFoundError, ValueError):
+            # FileNotFoundError: upstream was never cached
+            # ValueError: corrupt ref (JSONDecodeError)
+            return {}
+        if ref.get("head") != head:
+            return {}
+        return {
+            path: digest
+            for path, digest in ref.get("paths", {}).items()
+            if self._blob(digest).is_file()
+        }
+
+    def dump(self, repository: str, head: str, paths: dict[str, str]) -> None:
+        self._write(
+            self._ref(repository),
+            json.dumps({"head": head, "paths": paths}, indent=2).encode(),
+        )
+
+    def get(self, digest: str) -> bytes:
+        self.used.add(digest)
+        return self._blob(digest).read_bytes()
+
+    def put(self, content: bytes) -> str:
+        digest = sha256(content).hexdigest()
+        self.used.add(digest)
+        if not (blob := self._blob(digest)).is_file():
+            self._write(blob, content)
+        return digest
+
+    def prune(self) -> int:
+        # remove outdated blobs (and those of files no longer templated)
+        pruned = 0
+        for blob in self.path.glob("blobs/*"):
+            if blob.name not in self.used:
+                blob.unlink(missing_ok=True)
+                pruned += 1
+        return pruned
+
+
+class CachedRepository:
+    # mirror GitHub repository object, serving unchanged files from the cache
+    def __init__(
+        self,
+        repo: Repository,
+        cache: SourceCache,
+        head: str,
+        paths: dict[str, str] | None = None,
+    ) -> None:
+        self.repo = repo
+        self.cache = cache
+        self.head = head
+        self.paths = cache.load(repo.full_name, head) if paths is None else paths
+        self.fetched = False
+
+    def __getattr__(self, name: str) -> Any:
+        # everything else (full_name, html_url, etc.) comes from the repository
+        return getattr(self.repo, name)
+
+    def get_contents(self, path: str) -> Any:
+        if digest := self.paths.get(path):
+            return BlobContents(self.cache.get(digest))
+
+        contents = self.repo.get_contents(path)
+        self.paths[path] = self.cache.put(contents.decoded_content)
+        self.fetched = True
+        return contents
+
+    def dump(self) -> None:
+        # persist the paths once all files were fetched (only if anything was fetched)
+        if self.fetched:
+            self.cache.dump(self.repo.full_name, self.head, self.paths)
+
+
+class PrefetchedRepository:
+    # mirror GitHub repository object, serving contents fetched ahead of time
+    def __init__(self, repo: Repository, contents: dict[str, Future]) -> None:
+        self.repo = repo
+        self.contents = contents
+
+    def __getattr__(self, name: str) -> Any:
+        # everything else (full_name, html_url, etc.) comes from the repository
+        return getattr(self.repo, name)
+
+    def get_contents(self, path: str) -> Any:
+        try:
+            future = self.contents[path]
+        except KeyError:
+            # KeyError: path was not prefetched
+            return self.repo.get_contents(path)
+        else:
+            # re-raises the error (e.g., UnknownObjectException) of the fetch
+            return future.result()
+
+
+def get_sources(files: list[str | dict]) -> list[str]:
+    # unique sources to template, invalid definitions are reported by parse_config
+    sources = {}
+    for file in files:
+        if isinstance(file, str):
+            sources[file] = None
+        elif isinstance(file, dict) and not file.get("remove", False):
+            if isinstance(src := file.get("src"), str):
+                sources[src] = None
+    return list(sources)
+
+
+def prefetch_upstream(
+    pool: ThreadPoolExecutor,
+    config_path: Path,
+    gh: Github,
+    upstream_name: str,
+    files: list[str | dict],
+    git_url: str | None = None,
+    cache: SourceCache | None = None,
+) -> PrefetchedRepository:
+    if upstream_name.startswith("."):
+        # local files are read directly, never cached
+        upstream_repo = LocalRepository(config_path.parent / upstream_name)
+    elif git_url:
+        url = git_url.format(repository=upstream_name)
+        sources = get_sources(files)
+        if cache:
+            # revalidate once per upstream, only clone if a file is not cached
+            head = get_git_head(url)
+            cached = cache.load(upstream_name, head)
+            sources = [src for src in sources if src not in cached]
+
+        # a single clone instead of an API request per upstream and per file
+        upstream_repo = GitRepository(upstream_name, url, sources)
+        if cache:
+            upstream_repo = CachedRepository(upstream_repo, cache, head, cached)
+    else:
+        upstream_repo = gh.get_repo(upstream_name)
+        if cache:
+            # revalidate once per upstream (a single API request)
+            branch = upstream_repo.get_branch(upstream_repo.default_branch)
+            upstream_repo = CachedRepository(upstream_repo, cache, branch.commit.sha)
+
+    # queue the file fetches without waiting for them, they are awaited when templating
+    return PrefetchedRepository(
+        upstream_repo,
+        {
+            src: pool.submit(upstream_repo.get_contents, src)
+            for src in get_sources(files)
+        },
+    )
+
+
 def iterate_config(
     config_path: Path,
     config: dict,
     gh: Github,
     env: Environment,
     current_repo: Repository,
+    jobs: int = JOBS,
+    git_url: str | None = None,
+    cache: SourceCache | None = None,
+    dry_run: bool = False,
 ) -> int:
-    # iterate over configuration and template files
-    errors = 0
-    for upstream_name, files in config.items():
-        try:
-            if upstream_name.startswith("."):
-                upstream_repo = LocalRepository(config_path.parent / upstream_name)
-            else:
-                upstream_repo = gh.get_repo(upstream_name)
-        except (UnknownObjectException, FileNotFoundError) as err:
-            # UnknownObjectException: repository does not exist
-            # FileNotFoundError: path does not exist
-            perror(f"* :cross_mark: Failed to fetch `{upstream_name}`: {err}")
-            errors += 1
-            continue
-        else:
-            print(f"* :arrows_counterclockwise: Fetching files from `{upstream_name}`")
-
-        for file in files:
+    from github import UnknownObjectException
+
+    with ThreadPoolExecutor(jobs) as pool:
+        # resolve every upstream and fetch its files concurrently, templating (and its
+        # output) remains sequential in configuration order
+        upstreams = {
+            upstream_name: pool.submit(
+                prefetch_upstream,
+                pool,
+                config_path,
+                gh,
+                upstream_name,
+                files,
+                git_url,
+                cache,
+            )
+            for upstream_name, files in config.items()
+        }
+
+        # iterate over configuration and template files
+        errors = 0
+        for upstream_name, files in config.items():
             try:
-                # parse/standardize configuration
-                src, dst, remove, context = parse_config(file)
-            except ActionError:
+                upstream_repo = upstreams[upstream_name].result()
+            except (UnknownObjectException, FileNotFoundError) as err:
+                # UnknownObjectException: repository does not exist
+                # FileNotFoundError: path does not exist
+                perror(f"* :cross_mark: Failed to fetch `{upstream_name}`: {err}")
                 errors += 1
                 continue
-
-            if remove:
-                errors += remove_file(dst)
             else:
-                errors += template_file(
-                    env, current_repo, upstream_repo, src, dst, context
+                print(
+                    f"* :arrows_counterclockwise: Fetching files from `{upstream_name}`"
                 )
 
+            for file in files:
+                try:
+                    # parse/standardize configuration
+                    src, dst, remove, context = parse_config(file)
+                except ActionError:
+                    errors += 1
+                    continue
+
+                if remove:
+                    errors += remove_file(dst, dry_run)
+                else:
+                    errors += template_file(
+                        env, current_repo, upstream_repo, src, dst, context, dry_run
+                    )
+
+    # every fetch has completed, update the cache once per upstream
+    for future in upstreams.values():
+        if not future.exception() and isinstance(
+            cached := future.result().repo, CachedRepository
+        ):
+            cached.dump()
+
+    # a failed upstream did not use its blobs, only prune after a clean run
+    if cache and not errors:
+        cache.prune()
+
     return errors
 
 
@@ -552,10 +994,17 @@ def main():
     args = parse_args()
     if not args.config:
         print(":warning-emoji: No configuration file found, nothing to update")
-        dump_summary()
+        dump_summary(0)
         sys.exit(0)
     errors = 0
 
+    # heavy dependencies are only imported once there is something to template
+    from github import Auth, Github, UnknownObjectException
+    from jinja2.bccache import FileSystemBytecodeCache
+    from jinja2.loaders import FileSystemLoader
+
+    from template_audit import AuditEnvironment
+
     config = read_config(args.config)
 
     # initialize stub loader
@@ -575,6 +1024,11 @@ def main():
         comment_start_string="[#",
         comment_end_string="#]",
         keep_trailing_newline=True,
+        bytecode_cache=(
+            FileSystemBytecodeCache(args.bytecode_cache)
+            if args.bytecode_cache
+            else None
+        ),
     )
 
     # initialize GitHub client
@@ -589,7 +1043,17 @@ def main():
         errors += 1
 
     if not errors:
-        errors += iterate_config(args.config, config, gh, env, current_repo)
+        errors += iterate_config(
+            args.config,
+            config,
+            gh,
+            env,
+            current_repo,
+            args.jobs,
+            args.git_url if args.fetch == "git" else None,
+            SourceCache(args.cache_dir) if args.cache_dir else None,
+            args.dry_run,
+        )
 
     # provide audit of stub usage
     stubs = defaultdict(int)
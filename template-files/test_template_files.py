@@ -1,35 +1,50 @@
 from __future__ import annotations
 
+import subprocess
 import sys
 from argparse import ArgumentTypeError, Namespace
 from contextlib import nullcontext
 from inspect import isgenerator
 from pathlib import Path
+from types import SimpleNamespace
 from typing import TYPE_CHECKING
 from uuid import uuid4
 
 import pytest
 import yaml
+from github import UnknownObjectException
+from jinja2.bccache import FileSystemBytecodeCache
 from jinja2.environment import Environment
 from jinja2.exceptions import TemplateNotFound
 from jinja2.loaders import FileSystemLoader
 from jinja2.runtime import DebugUndefined, StrictUndefined, Undefined
 from jinja2.utils import missing
 from jsonschema.exceptions import ValidationError
+from rich import box
 from rich.console import Console
 from rich.measure import Measurement
+from rich.table import Table
 from rich.text import Text
 
+import template_files
+from template_audit import AuditContext, AuditEnvironment, AuditStubs
 from template_files import (
+    GIT_URL,
+    JOBS,
+    TRUNCATED_NOTICE,
     ActionError,
-    AuditContext,
-    AuditEnvironment,
-    AuditStubs,
+    BoundedRecord,
+    CachedRepository,
+    GitRepository,
     LocalRepository,
+    SourceCache,
+    SummaryConsole,
     TemplateState,
     dump_summary,
+    get_git_env,
     get_output_text,
     get_summary_text,
+    iterate_config,
     parse_args,
     parse_config,
     perror,
@@ -37,8 +52,10 @@ from template_files import (
     read_config,
     remove_file,
     template_file,
+    update_file,
     validate_dir,
     validate_file,
+    validate_jobs,
 )
 
 if TYPE_CHECKING:
@@ -257,6 +274,36 @@ def test_AuditEnvironment() -> None:
         assert variables["missing"] == missing
 
 
+def test_AuditEnvironment_from_string(tmp_path: Path, mocker: MockerFixture) -> None:
+    bytecode_cache = FileSystemBytecodeCache(tmp_path)
+    environment = AuditEnvironment(
+        loader=FileSystemLoader(UPSTREAM), bytecode_cache=bytecode_cache
+    )
+    compile = mocker.spy(environment, "compile")
+    source = "{% include 'stub' %}{{ variable }}"
+
+    # the same source templated to several destinations is compiled once
+    for dst in ("dst1", "dst2"):
+        with environment.audit("file", "src", dst) as (stubs, variables):
+            template = environment.from_string(source)
+            assert template.render(variable=dst) == f"This is a stub.{dst}"
+            # stubs are still audited for every destination
+            assert stubs == {"stub": 1}
+            assert variables == {"variable": dst}
+    assert environment.from_string(source) is template
+    # the source and the (cached) stub
+    assert [call.args[0] for call in compile.call_args_list].count(source) == 1
+    assert compile.call_count == 2
+
+    # compiled code is reused across environments (i.e., runs)
+    other = AuditEnvironment(bytecode_cache=bytecode_cache)
+    compile = mocker.spy(other, "compile")
+    assert other.from_string(source) is not template
+    assert not compile.called
+    other.from_string("changed")
+    assert compile.call_count == 1
+
+
 def test_validate_file(tmp_path: Path) -> None:
     # directory
     with pytest.raises(ArgumentTypeError, match=r"not a valid file"):
@@ -297,6 +344,13 @@ def test_validate_dir(tmp_path: Path) -> None:
     # TODO: not easy to test using either chmod or chown
 
 
+def test_validate_jobs() -> None:
+    assert validate_jobs("3") == 3
+    for value in ("0", "-1", "many"):
+        with pytest.raises(ArgumentTypeError):
+            validate_jobs(value)
+
+
 def test_parse_args(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
     with pytest.raises(SystemExit):
         assert parse_args([])
@@ -310,8 +364,16 @@ def test_parse_args(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
         assert parse_args([f"--stubs={stubs}"])
 
     assert parse_args([f"--config={config}", f"--stubs={stubs}"]) == Namespace(
-        config=config, stubs=stubs
+        config=config,
+        stubs=stubs,
+        jobs=JOBS,
+        dry_run=False,
+        fetch="contents",
+        git_url=GIT_URL,
+        bytecode_cache=None,
+        cache_dir=None,
     )
+    assert parse_args([f"--config={config}", f"--stubs={stubs}", "--jobs=2"]).jobs == 2
 
 
 @pytest.mark.parametrize(
@@ -446,8 +508,113 @@ def test_template_file(tmp_path: Path, capsys: CaptureFixture) -> None:
     assert stderr
 
 
-def test_iterate_config() -> None:
-    pass
+def test_update_file(tmp_path: Path, mocker: MockerFixture) -> None:
+    dst = tmp_path / "nested" / "file"
+
+    # new file
+    assert update_file(dst, "content\n") == (True, "")
+    assert dst.read_text() == "content\n"
+
+    # unchanged, not written
+    mtime = dst.stat().st_mtime_ns
+    assert update_file(dst, "content\n") == (False, "")
+    assert dst.stat().st_mtime_ns == mtime
+
+    # different size, not read
+    read_bytes = mocker.spy(Path, "read_bytes")
+    assert update_file(dst, "longer content\n") == (True, "")
+    assert not read_bytes.called
+    # same size, different content
+    assert update_file(dst, "longer CONTENT\n") == (True, "")
+    assert read_bytes.call_count == 1
+    assert dst.read_text() == "longer CONTENT\n"
+
+    # dry run
+    changed, diff = update_file(dst, "other", dry_run=True)
+    assert changed
+    assert dst.read_text() == "longer CONTENT\n"
+    assert diff == (
+        f"--- a/{dst}\n"
+        f"+++ b/{dst}\n"
+        "@@ -1 +1 @@\n"
+        "-longer CONTENT\n"
+        "+other\n"
+        "\\ No newline at end of file\n"
+    )
+    assert update_file(dst, "longer CONTENT\n", dry_run=True) == (False, "")
+    changed, diff = update_file(tmp_path / "missing", "new\n", dry_run=True)
+    assert changed
+    assert "+new\n" in diff
+    assert not (tmp_path / "missing").exists()
+
+
+def test_template_file_dry_run(tmp_path: Path, capsys: CaptureFixture) -> None:
+    environment = AuditEnvironment(loader=FileSystemLoader(UPSTREAM))
+    current = LocalRepository(tmp_path)
+    upstream = LocalRepository(UPSTREAM)
+    (dst := tmp_path / "out").write_text("old\n")
+
+    args = (environment, current, upstream, "stub", dst, {})
+    assert template_file(*args, dry_run=True) == 0
+    stdout, _ = capsys.readouterr()
+    assert "would change" in stdout
+    assert "-old\n+This is a stub.\n" in stdout
+    assert dst.read_text() == "old\n"
+
+    assert template_file(*args) == 0
+    assert template_file(*args) == 0
+    assert "unchanged" in capsys.readouterr().out.splitlines()[-1]
+
+    # the diff fence outlasts any backticks in the file
+    dst.write_text("````\ncode\n````\n")
+    assert template_file(*args, dry_run=True) == 0
+    stdout, _ = capsys.readouterr()
+    assert "`````diff\n" in stdout
+    assert stdout.rstrip().endswith("`````\n\n</details>")
+
+    assert remove_file(dst, dry_run=True) == 0
+    assert "would be removed" in capsys.readouterr().out
+    assert dst.exists()
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_iterate_config(
+    tmp_path: Path,
+    capsys: CaptureFixture,
+    mocker: MockerFixture,
+    jobs: int,
+) -> None:
+    environment = AuditEnvironment(loader=FileSystemLoader(UPSTREAM))
+    current = LocalRepository(tmp_path)
+    get_contents = mocker.spy(LocalRepository, "get_contents")
+    config = {
+        "./upstream": [
+            {"src": "success", "dst": str(tmp_path / "first"), "with": {"variable": 1}},
+            {
+                "src": "success",
+                "dst": str(tmp_path / "second"),
+                "with": {"variable": 2},
+            },
+            {"src": "missing", "dst": str(tmp_path / "missing")},
+            {"dst": str(tmp_path / "removed"), "remove": True},
+        ],
+        "./nonexistent": ["success"],
+    }
+
+    # missing file & nonexistent upstream
+    assert (
+        iterate_config(DATA / "config.yml", config, None, environment, current, jobs)
+        == 2
+    )
+    # every source is fetched once, even when templated more than once
+    assert get_contents.call_count == 2
+    assert (tmp_path / "first").read_text().endswith("undefined: 1")
+    assert (tmp_path / "second").read_text().endswith("undefined: 2")
+
+    # output remains in configuration order
+    stdout, stderr = capsys.readouterr()
+    assert stdout.index("first") < stdout.index("second") < stdout.index("removed")
+    assert stderr.index("missing") < stderr.index("nonexistent")
 
 
 def test_get_summary_text() -> None:
@@ -491,3 +658,287 @@ def test_dump_summary(
     assert error in stderr
     assert step_summary.read_text() == get_summary_text(f"{text}\n{error}\n")
     assert output.read_text() == old + get_output_text(1, f"{text}\n{error}\n")
+
+
+def test_summary_console(capsys: CaptureFixture) -> None:
+    console = SummaryConsole(color_system="standard", width=100, summary_limit=100)
+    assert isinstance(console._record_buffer, BoundedRecord)
+
+    print("a" * 49, console=console)
+    print("b" * 49, console=console)
+    print("c" * 49, console=console)
+    # everything is still printed, only the record is bounded
+    assert "c" * 49 in capsys.readouterr().out
+    assert console.export_text() == f"{'a' * 49}\n{'b' * 49}\n{TRUNCATED_NOTICE}"
+
+    # exporting clears the record and recording resumes
+    print("d" * 49, console=console)
+    assert console.export_text() == f"{'d' * 49}\n"
+
+
+def test_summary_console_boundaries() -> None:
+    console = SummaryConsole(color_system="standard", width=100, summary_limit=300)
+    console.print("<details>\n<summary>Tests</summary>\n", markup=False)
+    table = Table(box=box.MARKDOWN)
+    table.add_column("Test")
+    for i in range(20):
+        table.add_row(f"test_{i}")
+    console.print(table)
+
+    # the table doesn't fit and is dropped whole, the open block is closed
+    text = console.export_text()
+    assert "test_0" not in text
+    assert text == (
+        f"<details>\n<summary>Tests</summary>\n\n\n</details>\n{TRUNCATED_NOTICE}"
+    )
+
+    # a table that fits is recorded whole
+    console.print(table)
+    assert console.export_text().count("| test_") == 20
+
+
+def test_dump_summary_truncated(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("GITHUB_STEP_SUMMARY", str(step_summary := tmp_path / "summary"))
+    monkeypatch.delenv("GITHUB_OUTPUT", raising=False)
+
+    console = SummaryConsole(color_system="standard", width=100_000_000)
+    for _ in range(20_000):
+        print(uuid4().hex * 2, console=console)
+    dump_summary(0, console=console)
+    text = step_summary.read_text()
+    assert len(text.encode()) <= 2**20
+    assert text.endswith(TRUNCATED_NOTICE)
+
+
+def test_lazy_imports() -> None:
+    # importing (and the early exit without a config) doesn't import the templating,
+    # GitHub, or config dependencies
+    code = (
+        "import sys, template_files\n"
+        "heavy = {'github', 'jinja2', 'jsonschema', 'wrapt', 'yaml'}\n"
+        "print(*sorted(heavy & sys.modules.keys()))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert not result.stdout.strip()
+
+
+@pytest.fixture
+def git_url(tmp_path: Path) -> str:
+    # local bare repository standing in for `org/upstream` on GitHub
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    work = tmp_path / "work"
+    subprocess.run([*git, "init", "--quiet", work], check=True)
+    for path in UPSTREAM.iterdir():
+        (work / "nested" / path.name).parent.mkdir(parents=True, exist_ok=True)
+        (work / "nested" / path.name).write_bytes(path.read_bytes())
+    subprocess.run([*git, "-C", work, "add", "."], check=True)
+    subprocess.run([*git, "-C", work, "commit", "--quiet", "-m", "init"], check=True)
+    bare = tmp_path / "org" / "upstream.git"
+    subprocess.run(["git", "clone", "--bare", "--quiet", work, bare], check=True)
+    return f"file://{tmp_path}/{{repository}}.git"
+
+
+def test_GitRepository(git_url: str) -> None:
+    url = git_url.format(repository="org/upstream")
+    upstream = GitRepository("org/upstream", url, ["nested/success", "nested", "nope"])
+    assert upstream.full_name == "org/upstream"
+    assert upstream.name == "upstream"
+    assert upstream.html_url == url.removesuffix(".git")
+    assert (
+        upstream.get_contents("nested/success").decoded_content
+        == (UPSTREAM / "success").read_bytes()
+    )
+    # missing paths & directories are not found
+    for path in ("nested", "nope", "nested/stub"):
+        with pytest.raises(UnknownObjectException):
+            upstream.get_contents(path)
+
+    with pytest.raises(UnknownObjectException):
+        GitRepository("org/missing", git_url.format(repository="org/missing"), ["x"])
+
+
+def test_iterate_config_git(
+    tmp_path: Path, capsys: CaptureFixture, git_url: str
+) -> None:
+    environment = AuditEnvironment(loader=FileSystemLoader(UPSTREAM))
+    current = LocalRepository(tmp_path)
+    config = {
+        "org/upstream": [
+            {
+                "src": "nested/success",
+                "dst": str(tmp_path / "out"),
+                "with": {"variable": 1},
+            },
+            {"src": "nested/missing", "dst": str(tmp_path / "missing")},
+        ],
+        "org/missing": ["success"],
+    }
+
+    # the GitHub client is never used
+    assert (
+        iterate_config(DATA, config, None, environment, current, git_url=git_url) == 2
+    )
+    assert "Source repository: org/upstream" in (tmp_path / "out").read_text()
+    _, stderr = capsys.readouterr()
+    assert stderr.index("nested/missing") < stderr.index("org/missing")
+
+
+def test_get_git_env(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("GITHUB_TOKEN", "secret")
+    monkeypatch.setenv("GITHUB_SERVER_URL", "https://ghes.example.com")
+    env = get_git_env("https://github.com/org/repo.git")
+    assert env["GIT_CONFIG_KEY_0"] == "http.https://github.com/.extraHeader"
+    assert "GIT_CONFIG_VALUE_0" in get_git_env("https://ghes.example.com/org/repo.git")
+
+    # the token is never sent to any other host (or over plain HTTP)
+    for url in (
+        "file:///org/repo.git",
+        "http://github.com/org/repo.git",
+        "https://example.com/org/repo.git",
+        "https://github.com.example.com/org/repo.git",
+        "https://user@example.com/github.com/repo.git",
+        "https:///org/repo.git",
+    ):
+        assert "GIT_CONFIG_VALUE_0" not in get_git_env(url)
+
+    monkeypatch.delenv("GITHUB_SERVER_URL")
+    assert "GIT_CONFIG_VALUE_0" not in get_git_env("https://ghes.example.com/o/r.git")
+
+
+def test_SourceCache(tmp_path: Path) -> None:
+    cache = SourceCache(tmp_path / "cache")
+    digest = cache.put(b"content")
+    assert cache.put(b"content") == digest
+    assert cache.get(digest) == b"content"
+
+    assert cache.load("org/upstream", "head") == {}
+    cache.dump("org/upstream", "head", {"file": digest, "gone": "0" * 64})
+    # blobs that no longer exist are not cached
+    assert cache.load("org/upstream", "head") == {"file": digest}
+    # upstream moved
+    assert cache.load("org/upstream", "moved") == {}
+
+    (tmp_path / "cache" / "refs" / "org" / "upstream.json").write_text("{")
+    assert cache.load("org/upstream", "head") == {}
+
+    # blobs the current run did not use are pruned
+    other = cache.put(b"other")
+    cache = SourceCache(tmp_path / "cache")
+    cache.get(digest)
+    assert cache.prune() == 1
+    assert cache.get(digest) == b"content"
+    assert not (tmp_path / "cache" / "blobs" / other).exists()
+
+
+def test_CachedRepository(tmp_path: Path, mocker: MockerFixture) -> None:
+    cache = SourceCache(tmp_path / "cache")
+    upstream = LocalRepository(UPSTREAM)
+    get_contents = mocker.spy(upstream, "get_contents")
+
+    cached = CachedRepository(upstream, cache, "head")
+    content = cached.get_contents("success").decoded_content
+    assert content == (UPSTREAM / "success").read_bytes()
+    with pytest.raises(UnknownObjectException):
+        cached.get_contents("missing")
+    assert get_contents.call_count == 2
+    assert cached.full_name == upstream.full_name
+    cached.dump()
+
+    # unchanged files are served from the cache (across runs)
+    cached = CachedRepository(upstream, cache, "head")
+    assert cached.get_contents("success").decoded_content == content
+    assert get_contents.call_count == 2
+
+    # the upstream moved
+    CachedRepository(upstream, cache, "moved").get_contents("success")
+    assert get_contents.call_count == 3
+
+
+def test_iterate_config_contents_cache(tmp_path: Path, mocker: MockerFixture) -> None:
+    environment = AuditEnvironment(loader=FileSystemLoader(UPSTREAM))
+    current = LocalRepository(tmp_path)
+    cache = SourceCache(tmp_path / "cache")
+    dump = mocker.spy(cache, "dump")
+    upstream = LocalRepository(UPSTREAM)
+    upstream.default_branch = "main"
+    upstream.get_branch = mocker.Mock()
+    get_contents = mocker.spy(upstream, "get_contents")
+    gh = mocker.Mock()
+    gh.get_repo.return_value = upstream
+    config = {
+        "org/upstream": [
+            {"src": "success", "dst": str(tmp_path / "out"), "with": {"variable": 1}},
+            {"src": "stub", "dst": str(tmp_path / "stub")},
+        ],
+    }
+
+    def iterate(head: str) -> int:
+        get_contents.reset_mock()
+        dump.reset_mock()
+        upstream.get_branch.return_value = SimpleNamespace(
+            commit=SimpleNamespace(sha=head)
+        )
+        assert not iterate_config(DATA, config, gh, environment, current, cache=cache)
+        upstream.get_branch.assert_called_with("main")
+        assert (tmp_path / "out").read_text().endswith("undefined: 1")
+        return get_contents.call_count
+
+    # every file is fetched, the cache is written once per upstream
+    (stale := tmp_path / "cache" / "blobs" / ("0" * 64)).parent.mkdir(parents=True)
+    stale.write_bytes(b"stale")
+    assert iterate("head") == 2
+    # blobs not used by the run are pruned
+    assert not stale.exists()
+    assert len(list(stale.parent.iterdir())) == 2
+    dump.assert_called_once_with(upstream.full_name, "head", mocker.ANY)
+    # unchanged upstream, nothing is fetched (nor written)
+    assert iterate("head") == 0
+    dump.assert_not_called()
+    # upstream moved
+    assert iterate("moved") == 2
+    dump.assert_called_once()
+
+
+def test_iterate_config_git_cache(
+    tmp_path: Path, mocker: MockerFixture, git_url: str
+) -> None:
+    environment = AuditEnvironment(loader=FileSystemLoader(UPSTREAM))
+    current = LocalRepository(tmp_path)
+    cache = SourceCache(tmp_path / "cache")
+    fetch_git = mocker.spy(template_files, "fetch_git")
+    config = {
+        "org/upstream": [
+            {
+                "src": "nested/success",
+                "dst": str(tmp_path / "out"),
+                "with": {"variable": 1},
+            }
+        ],
+    }
+
+    def iterate() -> list[str]:
+        fetch_git.reset_mock()
+        errors = iterate_config(
+            DATA, config, None, environment, current, git_url=git_url, cache=cache
+        )
+        assert not errors
+        assert "Source repository: org/upstream" in (tmp_path / "out").read_text()
+        return fetch_git.call_args.args[1]
+
+    assert iterate() == ["nested/success"]
+    # unchanged upstream, nothing is cloned
+    assert iterate() == []
+
+    # upstream moved
+    bare = tmp_path / "org" / "upstream.git"
+    work = tmp_path / "work"
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run([*git, "-C", work, "commit", "-q", "--allow-empty", "-m", "2"])
+    subprocess.run(["git", "-C", work, "push", "-q", bare, "HEAD"], check=True)
+    assert iterate() == ["nested/success"]